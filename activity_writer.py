@@ -0,0 +1,88 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class ActivityWriter:
+    # Buffers activity rows in memory and hands them to `flush_rows` in
+    # batches from a background thread, once `batch_size` rows are queued or
+    # `flush_interval` seconds have passed. The queue is bounded: when it is
+    # full, log() waits up to `put_timeout` seconds and then writes the row
+    # on the caller's thread instead of dropping it.
+
+    def __init__(self, flush_rows, batch_size=200, flush_interval=1.0,
+                 max_queue=10000, put_timeout=0.5):
+        self.flush_rows = flush_rows
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.written = 0
+        self.overflow_writes = 0
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='activity-writer', daemon=True)
+                self._thread.start()
+                atexit.register(self.stop)
+
+    def log(self, row):
+        self.start()
+        try:
+            self._queue.put(row, timeout=self.put_timeout)
+        except queue.Full:
+            self.overflow_writes += 1
+            self._write([row])
+
+    def stop(self, timeout=10):
+        # Flush everything still queued and stop the thread
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None and thread.is_alive():
+            self._queue.put(_STOP)
+            thread.join(timeout)
+        atexit.unregister(self.stop)
+
+    def _write(self, rows):
+        try:
+            self.flush_rows(rows)
+            self.written += len(rows)
+        except Exception:
+            logger.exception('Failed to write %d activity rows', len(rows))
+
+    def _run(self):
+        rows = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                row = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                row = None
+            if row is _STOP:
+                break
+            if row is not None:
+                rows.append(row)
+            if len(rows) >= self.batch_size or time.monotonic() >= deadline:
+                if rows:
+                    self._write(rows)
+                    rows = []
+                deadline = time.monotonic() + self.flush_interval
+        # Drain whatever arrived before the stop marker
+        while True:
+            try:
+                row = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if row is not _STOP:
+                rows.append(row)
+        if rows:
+            self._write(rows)
@@ -0,0 +1,301 @@
+from datetime import date
+
+import numpy as np
+
+# Vectorized attendance analytics.
+#
+# AttendanceFrame holds attendance as four flat NumPy columns, 16 bytes a
+# record, built straight from fetched column tuples with no ORM objects:
+#
+#   employee_id  int32
+#   day          int32  days since 1970-01-01
+#   clock_in     int32  seconds after midnight of `day`
+#   duration     int32  seconds worked, -1 while the session is open
+#
+# summarize() lays a period out as an employees x days grid and derives
+# every metric from a few bincounts and reductions over it, so its cost
+# depends on the number of records and not on Python-level loops.
+
+OPEN = -1
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+DAILY_HOUR_BINS = 14  # 0-1h ... 13h+
+
+
+class AttendanceFrame:
+    def __init__(self, employee_id, day, clock_in, duration):
+        self.employee_id = employee_id
+        self.day = day
+        self.clock_in = clock_in
+        self.duration = duration
+
+    def __len__(self):
+        return len(self.employee_id)
+
+    @property
+    def nbytes(self):
+        return sum(column.nbytes for column in (self.employee_id, self.day, self.clock_in, self.duration))
+
+    @classmethod
+    def empty(cls):
+        return cls(*(np.empty(0, dtype=np.int32) for _ in range(4)))
+
+    @classmethod
+    def from_columns(cls, employee_ids, dates, clock_ins, clock_outs):
+        # Sequences of ids and of dates and datetimes, as objects or as ISO
+        # text (clock_out None while open)
+        count = len(employee_ids)
+        if not count:
+            return cls.empty()
+        day = _epoch(dates, 'D')
+        clock_in = _epoch(clock_ins, 's')
+        clock_out = _epoch(clock_outs, 's')
+        duration = np.where(clock_out == OPEN, OPEN, clock_out - clock_in)
+        return cls(
+            np.fromiter(employee_ids, dtype=np.int32, count=count),
+            day.astype(np.int32),
+            (clock_in - day * 86400).astype(np.int32),
+            duration.astype(np.int32),
+        )
+
+    @classmethod
+    def concat(cls, frames):
+        frames = [frame for frame in frames if len(frame)]
+        if not frames:
+            return cls.empty()
+        return cls(*(np.concatenate([getattr(frame, name) for frame in frames])
+                     for name in ('employee_id', 'day', 'clock_in', 'duration')))
+
+    def between(self, start, end):
+        # Records with start <= day <= end (datetime.date bounds)
+        mask = (self.day >= _day_number(start)) & (self.day <= _day_number(end))
+        return AttendanceFrame(self.employee_id[mask], self.day[mask], self.clock_in[mask], self.duration[mask])
+
+
+class Staff:
+    # Employees as parallel arrays: id, department code and hire day
+    def __init__(self, ids, departments, hire_dates):
+        order = np.argsort(np.asarray(ids, dtype=np.int64), kind='stable')
+        self.ids = np.asarray(ids, dtype=np.int64)[order]
+        names, codes = np.unique(np.array(departments, dtype=str), return_inverse=True)
+        self.department_names = [str(name) for name in names]
+        self.department = codes[order]
+        # A missing hire date is NaT, which as an integer is the smallest
+        # int64, so that employee counts as employed throughout
+        self.hire_day = np.array(hire_dates, dtype='datetime64[D]').astype(np.int64)[order]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def rows(self, employee_ids):
+        # Row of each id in the arrays above, -1 for unknown ids. Ids are
+        # autoincrement keys, so a table indexed by id is usually small and
+        # far faster than a binary search over millions of records
+        employee_ids = np.asarray(employee_ids, dtype=np.int64)
+        if not len(self.ids):
+            return np.full(len(employee_ids), -1, dtype=np.int64)
+        if self.ids[0] >= 0 and self.ids[-1] <= 4 * len(self.ids) + 1024:
+            table = np.full(int(self.ids[-1]) + 1, -1, dtype=np.int64)
+            table[self.ids] = np.arange(len(self.ids))
+            inside = (employee_ids >= 0) & (employee_ids < len(table))
+            return np.where(inside, table[np.clip(employee_ids, 0, len(table) - 1)], -1)
+        position = np.minimum(np.searchsorted(self.ids, employee_ids), len(self.ids) - 1)
+        return np.where(self.ids[position] == employee_ids, position, -1)
+
+
+def _epoch(values, unit):
+    # Days ('D') or seconds ('s') since the epoch, OPEN where missing. Text
+    # (what SQLite stores) parses in C; NumPy converts date and datetime
+    # objects one at a time and slowly, so those go through plain integers
+    values = list(values)
+    sample = next((value for value in values if value is not None), None)
+    if sample is None or isinstance(sample, str):
+        parsed = np.array(values, dtype=f'datetime64[{unit}]')
+        return np.where(np.isnat(parsed), OPEN, parsed.astype(np.int64))
+    convert = _day_of if unit == 'D' else _seconds_of
+    return np.fromiter(map(convert, values), dtype=np.int64, count=len(values))
+
+
+def _day_of(value):
+    return value.toordinal() - EPOCH_ORDINAL
+
+
+def _seconds_of(moment):
+    # Seconds since the epoch, OPEN for None
+    if moment is None:
+        return OPEN
+    return (moment.toordinal() - EPOCH_ORDINAL) * 86400 + moment.hour * 3600 + moment.minute * 60 + moment.second
+
+
+def _day_number(value):
+    return int(np.datetime64(value, 'D').astype(np.int64))
+
+
+def _rate(numerator, denominator):
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.asarray(denominator, dtype=np.float64)
+    return np.divide(numerator, denominator, out=np.zeros_like(numerator), where=denominator > 0)
+
+
+def _grid(frame, staff, start, end):
+    # Lays start..end (inclusive dates) out as employees x days arrays:
+    # whether the employee was present, closed-session seconds, first
+    # clock-in (seconds after midnight) and whether they were employed yet.
+    # Returns those with the days and the number of records used.
+    first_day, last_day = _day_number(start), _day_number(end)
+    n_days = last_day - first_day + 1
+    frame = frame.between(start, end)
+
+    # Records of employees that no longer exist are left out
+    position = staff.rows(frame.employee_id)
+    known = position >= 0
+    row = position[known]
+    column = frame.day[known].astype(np.int64) - first_day
+    clock_in = frame.clock_in[known]
+    duration = frame.duration[known]
+    closed = duration != OPEN
+
+    n_staff = len(staff)
+    cell = row * n_days + column
+    size = n_staff * n_days
+    present = (np.bincount(cell, minlength=size) > 0).reshape(n_staff, n_days)
+    seconds = np.bincount(cell[closed], weights=duration[closed], minlength=size).reshape(n_staff, n_days)
+    first_in = np.full(size, np.iinfo(np.int32).max, dtype=np.int32)
+    np.minimum.at(first_in, cell, clock_in)
+    first_in = first_in.reshape(n_staff, n_days)
+    employed = staff.hire_day[:, None] <= np.arange(first_day, last_day + 1)[None, :]
+    days = np.arange(first_day, last_day + 1).astype('datetime64[D]')
+    return days, present, seconds, first_in, employed, len(row)
+
+
+def summarize(frame, staff, start, end, late_after=9 * 3600 + 30 * 60, overtime_hours=9.0, top=50):
+    # Org-wide metrics for start..end (inclusive dates)
+    days, present, seconds, first_in, employed, records = _grid(frame, staff, start, end)
+    n_staff, n_days = present.shape
+    hours = seconds / 3600
+    late = present & (first_in > late_after)
+    overtime = hours > overtime_hours
+
+    # Working days and who was employed on each of them
+    workday = np.is_busday(days)
+    expected = employed & workday[None, :]
+    absent = expected & ~present
+
+    # Per employee, then summed per department
+    department = staff.department
+    employee_hours = hours.sum(axis=1)
+    employee_days = present.sum(axis=1)
+    employee_late = late.sum(axis=1)
+    employee_overtime = overtime.sum(axis=1)
+    worked_days = (hours > 0).sum(axis=1)
+    expected_days = expected.sum(axis=1)
+    absent_days = absent.sum(axis=1)
+
+    totals = {
+        name: np.bincount(department, weights=values, minlength=len(staff.department_names))
+        for name, values in (('employees', np.ones(n_staff)), ('hours', employee_hours),
+                             ('days', employee_days), ('late', employee_late),
+                             ('overtime', employee_overtime), ('worked', worked_days),
+                             ('expected', expected_days), ('absent', absent_days))
+    }
+    average_hours = _rate(totals['hours'], totals['worked'])
+    absenteeism = _rate(totals['absent'], totals['expected'])
+    department_rows = [{
+        'name': name,
+        'employees': int(totals['employees'][code]),
+        'hours': round(float(totals['hours'][code]), 1),
+        'avg_daily_hours': round(float(average_hours[code]), 2),
+        'days_present': int(totals['days'][code]),
+        'late_arrivals': int(totals['late'][code]),
+        'overtime_days': int(totals['overtime'][code]),
+        'absenteeism_rate': round(float(absenteeism[code]), 4),
+    } for code, name in enumerate(staff.department_names)]
+
+    day_rows = []
+    day_hours = hours.sum(axis=0)
+    day_present = present.sum(axis=0)
+    day_late = late.sum(axis=0)
+    day_absence = _rate(absent.sum(axis=0), expected.sum(axis=0))
+    for index in range(n_days):
+        day_rows.append({
+            'date': str(days[index]),
+            'workday': bool(workday[index]),
+            'present': int(day_present[index]),
+            'hours': round(float(day_hours[index]), 1),
+            'late_arrivals': int(day_late[index]),
+            'absenteeism_rate': round(float(day_absence[index]), 4),
+        })
+
+    busiest = np.argsort(-employee_hours, kind='stable')[:top]
+    employee_rows = [{
+        'employee_id': int(staff.ids[index]),
+        'department': staff.department_names[department[index]],
+        'hours': round(float(employee_hours[index]), 1),
+        'days_present': int(employee_days[index]),
+        'late_arrivals': int(employee_late[index]),
+        'overtime_days': int(employee_overtime[index]),
+    } for index in busiest if employee_hours[index] > 0]
+
+    daily = hours[hours > 0]
+    daily_counts = np.bincount(np.minimum(daily.astype(np.int64), DAILY_HOUR_BINS - 1),
+                               minlength=DAILY_HOUR_BINS)
+    arrivals = first_in[present] // 3600
+    arrival_counts = np.bincount(np.clip(arrivals, 0, 23), minlength=24)
+
+    total_hours = float(employee_hours.sum())
+    return {
+        'period': {
+            'start': str(days[0]),
+            'end': str(days[-1]),
+            'days': int(n_days),
+            'workdays': int(workday.sum()),
+        },
+        'totals': {
+            'records': int(records),
+            'employees': int(n_staff),
+            'hours': round(total_hours, 1),
+            'avg_daily_hours': round(float(_rate(total_hours, worked_days.sum())), 2),
+            'days_present': int(employee_days.sum()),
+            'late_arrivals': int(late.sum()),
+            'overtime_days': int(overtime.sum()),
+            'absenteeism_rate': round(float(_rate(absent_days.sum(), expected_days.sum())), 4),
+        },
+        'departments': department_rows,
+        'days': day_rows,
+        'top_employees': employee_rows,
+        'distributions': {
+            'daily_hours': {
+                'labels': [f'{hour}h' for hour in range(DAILY_HOUR_BINS - 1)] + [f'{DAILY_HOUR_BINS - 1}h+'],
+                'counts': daily_counts.tolist(),
+            },
+            'arrival_hour': {
+                'labels': [f'{hour:02d}:00' for hour in range(24)],
+                'counts': arrival_counts.tolist(),
+            },
+        },
+    }
+
+
+def daily_by_department(frame, staff, start, end, late_after=9 * 3600 + 30 * 60):
+    # One row per day and department for start..end: headcount (employees
+    # hired by that day), present, closed-session seconds and late arrivals.
+    # Departments with nobody employed or present that day are left out.
+    days, present, seconds, first_in, employed, _ = _grid(frame, staff, start, end)
+    late = present & (first_in > late_after)
+    # departments x employees membership, so each total is one product
+    membership = (staff.department[None, :] == np.arange(len(staff.department_names))[:, None]).astype(np.float64)
+    headcount = membership @ employed
+    present_count = membership @ present
+    total_seconds = membership @ seconds
+    late_count = membership @ late
+    rows = []
+    for code, name in enumerate(staff.department_names):
+        for index in np.flatnonzero((headcount[code] > 0) | (present_count[code] > 0)):
+            rows.append({
+                'day': days[index].astype(object),
+                'department': name,
+                'headcount': int(headcount[code, index]),
+                'present': int(present_count[code, index]),
+                'total_seconds': int(round(total_seconds[code, index])),
+                'late_arrivals': int(late_count[code, index]),
+            })
+    return rows
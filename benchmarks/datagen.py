@@ -0,0 +1,108 @@
+import random
+from datetime import date, datetime, time, timedelta
+
+from werkzeug.security import generate_password_hash
+
+# Synthetic data for benchmarks: N employees spread over departments with M
+# months of weekday attendance and the matching activity rows, written with
+# executemany in chunks. Every generated user has the password PASSWORD.
+
+PASSWORD = 'bench'
+CHUNK = 5000
+DEPARTMENTS = [
+    'IT', 'Finance', 'Marketing', 'Operations', 'Sales', 'Research',
+    'Customer Service', 'Administration', 'Human Resources',
+]
+POSITIONS = ['Manager', 'Team Lead', 'Senior', 'Associate', 'Intern']
+FIRST_NAMES = [
+    'Aarav', 'Priya', 'John', 'Maria', 'Wei', 'Fatima', 'Lucas', 'Emma', 'Ravi', 'Sofia',
+    'Omar', 'Chen', 'Anna', 'Arjun', 'Olivia', 'Noah', 'Meera', 'Liam', 'Yuki', 'Diego',
+]
+LAST_NAMES = [
+    'Sharma', 'Smith', 'Garcia', 'Wang', 'Khan', 'Müller', 'Rossi', 'Patel', 'Kim', 'Silva',
+    'Iyer', 'Brown', 'Nguyen', 'Lopez', 'Singh', 'Tanaka', 'Cohen', 'Novak', 'Reddy', 'Costa',
+]
+
+
+def _insert(db, table, rows):
+    for start in range(0, len(rows), CHUNK):
+        db.session.execute(table.insert(), rows[start:start + CHUNK])
+
+
+def _months_back(today, months):
+    start = today.replace(day=1)
+    for _ in range(months - 1):
+        start = (start - timedelta(days=1)).replace(day=1)
+    return start
+
+
+def generate(db, employees=1000, months=3, seed=42, today=None):
+    # Populate an empty schema; returns the generated usernames by role
+    from models import User, Employee, Attendance, Activity
+
+    rng = random.Random(seed)
+    today = today or date.today()
+    password_hash = generate_password_hash(PASSWORD)
+
+    users = [{'username': 'admin', 'password_hash': password_hash, 'role': 'admin'},
+             {'username': 'hr', 'password_hash': password_hash, 'role': 'hr'}]
+    users += [{'username': f'emp{i}', 'password_hash': password_hash, 'role': 'employee'}
+              for i in range(employees)]
+    _insert(db, User.__table__, users)
+    user_ids = dict(db.session.query(User.username, User.id))
+
+    hired = datetime.combine(_months_back(today, months + 12), time(9))
+    staff = [{'name': 'System Administrator', 'department': 'Administration',
+              'position': 'System Administrator', 'salary': 80000, 'user_id': user_ids['admin'],
+              'hire_date': hired},
+             {'name': 'HR Manager', 'department': 'Human Resources', 'position': 'HR Manager',
+              'salary': 60000, 'user_id': user_ids['hr'], 'hire_date': hired}]
+    staff += [{'name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i}',
+               'department': rng.choice(DEPARTMENTS),
+               'position': rng.choice(POSITIONS),
+               'salary': rng.randrange(30000, 120000, 500),
+               'user_id': user_ids[f'emp{i}'],
+               'hire_date': hired}
+              for i in range(employees)]
+    _insert(db, Employee.__table__, staff)
+    employee_rows = db.session.query(Employee.id, Employee.name, Employee.user_id).all()
+
+    day = _months_back(today, months)
+    attendance = []
+    activities = []
+    while day <= today:
+        if day.weekday() < 5:
+            for employee_id, name, user_id in employee_rows:
+                if rng.random() > 0.92:
+                    continue
+                clock_in = datetime.combine(day, time(8)) + timedelta(minutes=rng.randint(0, 120))
+                clock_out = None
+                if day < today or rng.random() < 0.4:
+                    clock_out = clock_in + timedelta(minutes=rng.randint(420, 600))
+                attendance.append({'employee_id': employee_id, 'clock_in': clock_in,
+                                   'clock_out': clock_out, 'date': day,
+                                   'open_day': day if clock_out is None else None})
+                activities.append({'type': 'clock_in', 'message': f'{name} clocked in',
+                                   'timestamp': clock_in, 'user_id': user_id})
+                if clock_out:
+                    activities.append({'type': 'clock_out', 'message': f'{name} clocked out',
+                                       'timestamp': clock_out, 'user_id': user_id})
+            if len(attendance) >= CHUNK:
+                _insert(db, Attendance.__table__, attendance)
+                _insert(db, Activity.__table__, activities)
+                attendance, activities = [], []
+        day += timedelta(days=1)
+    _insert(db, Attendance.__table__, attendance)
+    _insert(db, Activity.__table__, activities)
+    db.session.commit()
+
+    return {'admin': 'admin', 'hr': 'hr', 'employees': [f'emp{i}' for i in range(employees)]}
+
+
+def build_derived(app):
+    # Rebuild the rollup and search tables the way an upgrade would
+    runner = app.test_cli_runner()
+    for command in ('rebuild-attendance-summary', 'rebuild-search-index', 'repair-departments'):
+        result = runner.invoke(args=[command])
+        if result.exit_code:
+            raise RuntimeError(f'{command} failed: {result.output}')
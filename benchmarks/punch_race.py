@@ -0,0 +1,111 @@
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import date
+
+# Hammers one employee's clock-in/clock-out from many threads at once and
+# checks the punch invariants afterwards:
+#
+#   python -m benchmarks.punch_race --threads 16 --rounds 50
+#
+# Every thread has its own logged-in session for the same employee and
+# fires clock-ins and clock-outs back to back, some of them replayed with
+# the same idempotency key (a double-click). Afterwards there must be at
+# most one open session, every accepted punch must be a distinct session,
+# and the monthly rollup must match the raw rows. Exits 1 on a violation.
+
+
+def check(condition, message):
+    print(f'  {"ok  " if condition else "FAIL"} {message}')
+    return condition
+
+
+def hammer(app, username, password, rounds, barrier, outcomes, lock):
+    client = app.test_client()
+    client.post('/login', data={'username': username, 'password': password})
+    barrier.wait()
+    for i in range(rounds):
+        path = '/clock-in' if i % 2 == 0 else '/clock-out'
+        key = uuid.uuid4().hex
+        # Every third punch is sent twice with the same key
+        for _ in range(2 if i % 3 == 0 else 1):
+            response = client.post(path, data={'punch_key': key})
+            with lock:
+                outcomes[response.status_code] = outcomes.get(response.status_code, 0) + 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Concurrent punches for one employee')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--rounds', type=int, default=50, help='Punches per thread')
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='attendance-punch-race-')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'race.db')
+    os.environ.setdefault('ACTIVITY_WRITER', 'sync')
+    os.environ.setdefault('SNAPSHOT_SCHEDULER', '0')
+
+    from app import create_app
+    from benchmarks import datagen
+    from extensions import db
+    from models import User, Attendance, AttendanceMonthlySummary
+
+    # Writers queue on SQLite's database lock instead of failing after 5s
+    app = create_app({'SQLALCHEMY_ENGINE_OPTIONS': {'connect_args': {'timeout': 60}}})
+    with app.app_context():
+        db.create_all()
+        users = datagen.generate(db, employees=5, months=1, seed=1)
+        datagen.build_derived(app)
+        employee = User.query.filter_by(username=users['employees'][0]).one().employee
+        employee_id = employee.id
+        Attendance.query.filter_by(employee_id=employee_id, date=date.today()).delete()
+        AttendanceMonthlySummary.query.filter_by(employee_id=employee_id).delete()
+        db.session.commit()
+
+    outcomes = {}
+    lock = threading.Lock()
+    barrier = threading.Barrier(args.threads)
+    threads = [threading.Thread(target=hammer, args=(app, users['employees'][0], datagen.PASSWORD,
+                                                     args.rounds, barrier, outcomes, lock))
+               for _ in range(args.threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    requests = sum(outcomes.values())
+    print(f'{requests} punches from {args.threads} threads in {elapsed:.2f}s '
+          f'({requests / elapsed:.0f}/s), status codes {dict(sorted(outcomes.items()))}')
+
+    today = date.today()
+    with app.app_context():
+        records = Attendance.query.filter_by(employee_id=employee_id, date=today).all()
+        summary = AttendanceMonthlySummary.for_month(employee_id, today)
+        open_records = [record for record in records if record.clock_out is None]
+        closed = [record for record in records if record.clock_out is not None]
+        seconds = sum(int(round((record.clock_out - record.clock_in).total_seconds())) for record in closed)
+        keys = [record.clock_in_key for record in records]
+
+        results = [
+            check(outcomes.get(500, 0) == 0, 'no request failed'),
+            check(len(open_records) <= 1, f'at most one open session ({len(open_records)} open)'),
+            check(all(record.open_day == today for record in open_records)
+                  and all(record.open_day is None for record in closed),
+                  'open_day is set exactly on the open session'),
+            check(len(keys) == len(set(keys)), f'no replayed key created a session ({len(records)} sessions)'),
+            check(summary is not None and summary.days_present == (1 if records else 0),
+                  'the day is counted once in the rollup'),
+            check(summary is not None and summary.closed_sessions == len(closed)
+                  and summary.total_seconds == seconds,
+                  f'rollup matches the rows ({len(closed)} closed sessions, {seconds}s)'),
+        ]
+    return 0 if all(results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
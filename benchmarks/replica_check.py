@@ -0,0 +1,109 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date
+
+# Checks read/write routing with two SQLite files standing in for the
+# primary and the replica:
+#
+#   python -m benchmarks.replica_check
+#
+# The replica is a copy of the primary taken once, so it never sees later
+# writes, which makes every misrouted read or write visible.
+
+
+class StatementLog:
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.statements = []
+        event.listen(engine, 'before_cursor_execute', self._record)
+
+    def _record(self, conn, cursor, statement, *args):
+        self.statements.append(statement.lstrip().split(None, 1)[0].upper())
+
+    def reads(self):
+        return self.statements.count('SELECT')
+
+    def writes(self):
+        return len([s for s in self.statements if s in ('INSERT', 'UPDATE', 'DELETE')])
+
+
+def check(condition, message):
+    print(f'  {"ok  " if condition else "FAIL"} {message}')
+    return condition
+
+
+def main():
+    workdir = tempfile.mkdtemp(prefix='attendance-replica-')
+    primary_path = os.path.join(workdir, 'primary.db')
+    replica_path = os.path.join(workdir, 'replica.db')
+    # The app reads its configuration at import time
+    os.environ['DATABASE_URL'] = 'sqlite:///' + primary_path
+    os.environ['DATABASE_REPLICA_URL'] = 'sqlite:///' + replica_path
+    os.environ['READ_YOUR_WRITES_SECONDS'] = '1'
+    os.environ.setdefault('SNAPSHOT_SCHEDULER', '0')
+
+    from app import create_app
+    from benchmarks import datagen
+    from extensions import db, activity_writer
+    from models import User, Attendance
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        users = datagen.generate(db, employees=50, months=1, seed=1)
+        datagen.build_derived(app)
+        # Start the checked employee off the clock
+        puncher = User.query.filter_by(username=users['employees'][0]).one().employee
+        Attendance.query.filter_by(employee_id=puncher.id, date=date.today()).delete()
+        db.session.commit()
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+        shutil.copyfile(primary_path, replica_path)
+        primary = StatementLog(db.engines[None])
+        replica = StatementLog(db.engines['replica'])
+
+    client = app.test_client()
+    client.post('/login', data={'username': users['employees'][0], 'password': datagen.PASSWORD})
+    hr = app.test_client()
+    hr.post('/login', data={'username': users['hr'], 'password': datagen.PASSWORD})
+
+    results = []
+    before = replica.reads()
+    hr.get('/employees')
+    results.append(check(replica.reads() > before, 'read-only page is served by the replica'))
+
+    client.post('/clock-in')
+    results.append(check(replica.writes() == 0 and primary.writes() > 0, 'clock-in writes go to the primary'))
+
+    page = client.get('/attendance').get_data(as_text=True)
+    results.append(check('Not clocked in' not in page, 'the page after a punch reads its own write'))
+
+    time.sleep(1.1)
+    before = replica.reads()
+    page = client.get('/attendance').get_data(as_text=True)
+    results.append(check(replica.reads() > before and 'Not clocked in' in page,
+                         'once the pin expires reads go back to the (stale) replica'))
+
+    before = replica.reads()
+    client.post('/clock-out')
+    results.append(check(replica.reads() == before, 'write views never read from the replica'))
+
+    # Only the primary has today's (now closed) session
+    before = replica.reads()
+    page = client.get('/attendance').get_data(as_text=True)
+    results.append(check(replica.reads() == before and date.today().isoformat() in page,
+                         'the page after a clock-out reads its own write'))
+
+    # Write out queued activity rows before the files go away
+    with app.app_context():
+        activity_writer.stop()
+    shutil.rmtree(workdir, ignore_errors=True)
+    return 0 if all(results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,223 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# Times the main pages through the Flask test client against a generated
+# SQLite database, at one or more data sizes, and reports latency
+# percentiles and SQL statements per request. Results can be saved as a
+# JSON baseline and compared with a later run:
+#
+#   python -m benchmarks.run --sizes 100,1000 --output benchmarks/baseline.json
+#   python -m benchmarks.run --sizes 100,1000 --compare benchmarks/baseline.json
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(timings, queries):
+    timings = sorted(timings)
+    return {
+        'requests': len(timings),
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'p50_ms': round(percentile(timings, 0.50), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+        'p99_ms': round(percentile(timings, 0.99), 3),
+        'queries_per_request': round(statistics.fmean(queries), 2),
+    }
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+
+def login(app, username, password):
+    client = app.test_client()
+    response = client.post('/login', data={'username': username, 'password': password})
+    if response.status_code != 302:
+        raise RuntimeError(f'login failed for {username}')
+    return client
+
+
+def measure(counter, repeat, request):
+    timings, queries = [], []
+    for i in range(repeat):
+        before = counter.count
+        started = time.perf_counter()
+        response = request(i)
+        timings.append((time.perf_counter() - started) * 1000)
+        queries.append(counter.count - before)
+        if response.status_code >= 400:
+            raise RuntimeError(f'request failed with {response.status_code}')
+    return summarize(timings, queries)
+
+
+def run_size(size, months, repeat, seed):
+    from app import create_app
+    from benchmarks import datagen
+    from extensions import db
+
+    app = create_app()
+    services = app.extensions['attendance']
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        started = time.perf_counter()
+        users = datagen.generate(db, employees=size, months=months, seed=seed)
+        datagen.build_derived(app)
+        generate_seconds = time.perf_counter() - started
+        counter = QueryCounter(db.engine)
+
+    services['dashboard_cache'].clear()
+    services['identity_cache'].clear()
+    admin = login(app, users['admin'], datagen.PASSWORD)
+    employee = login(app, users['employees'][0], datagen.PASSWORD)
+    puncher_names = users['employees'][1:repeat + 1]
+    punchers = [login(app, username, datagen.PASSWORD) for username in puncher_names]
+
+    def cold_dashboard(i):
+        services['dashboard_cache'].clear()
+        return admin.get('/dashboard')
+
+    def cold_analytics(i):
+        services['analytics_cache'].clear()
+        return admin.get('/api/analytics')
+
+    def cold_page(client, path, **kwargs):
+        # Rendered from scratch, as without the fragment cache
+        services['fragment_cache'].clear()
+        return client.get(path, **kwargs)
+
+    def revalidate(client, path):
+        # A browser sending back the ETag of an unchanged page; the first
+        # request shows any pending flash message, which has no ETag
+        client.get(path)
+        etag = client.get(path).headers['ETag']
+        return lambda i: client.get(path, headers={'If-None-Match': etag})
+
+    scenarios = {
+        'dashboard (cold cache)': lambda i: cold_dashboard(i),
+        'dashboard (warm cache)': lambda i: admin.get('/dashboard'),
+        'employees': lambda i: cold_page(admin, '/employees'),
+        'employees (cached fragment)': lambda i: admin.get('/employees'),
+        'employees (not modified)': revalidate(admin, '/employees'),
+        'employees search': lambda i: cold_page(admin, '/employees', query_string={'search': 'pri'}),
+        'employees search + department': lambda i: cold_page(
+            admin, '/employees', query_string={'search': 'sharma', 'department': 'IT'}),
+        'attendance (admin)': lambda i: cold_page(admin, '/attendance'),
+        'attendance (employee)': lambda i: cold_page(employee, '/attendance'),
+        'attendance (cached fragment)': lambda i: employee.get('/attendance'),
+        'attendance (not modified)': revalidate(employee, '/attendance'),
+        'activity timeline': lambda i: admin.get('/api/activity'),
+        'analytics (cold cache)': lambda i: cold_analytics(i),
+        'analytics (warm cache)': lambda i: admin.get('/api/analytics'),
+        'clock_out': lambda i: punchers[i % len(punchers)].post('/clock-out'),
+        'clock_in': lambda i: punchers[i % len(punchers)].post('/clock-in'),
+    }
+    # Make sure every puncher is clocked in before the clock_out scenario
+    for client in punchers:
+        client.post('/clock-in')
+
+    results = {'generate_seconds': round(generate_seconds, 2), 'scenarios': {}}
+    for name, request in scenarios.items():
+        count = min(repeat, len(punchers)) if name.startswith('clock_') else repeat
+        results['scenarios'][name] = measure(counter, count, request)
+    return results
+
+
+def print_results(results):
+    for size, data in results['sizes'].items():
+        print(f'\n{size} employees (data generated in {data["generate_seconds"]}s)')
+        print(f'  {"scenario":32} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"queries":>8}')
+        for name, stats in data['scenarios'].items():
+            print(f'  {name:32} {stats["p50_ms"]:9.2f} {stats["p95_ms"]:9.2f} '
+                  f'{stats["p99_ms"]:9.2f} {stats["queries_per_request"]:8.1f}')
+
+
+def compare(results, baseline, threshold):
+    # Returns the scenarios whose p95 or query count grew past the threshold
+    regressions = []
+    print(f'\nCompared with baseline from {baseline["meta"]["created"]}:')
+    for size, data in results['sizes'].items():
+        base_size = baseline['sizes'].get(size)
+        if not base_size:
+            continue
+        for name, stats in data['scenarios'].items():
+            base = base_size['scenarios'].get(name)
+            if not base:
+                continue
+            ratio = stats['p95_ms'] / base['p95_ms'] if base['p95_ms'] else 1.0
+            query_delta = stats['queries_per_request'] - base['queries_per_request']
+            flag = ''
+            if ratio > threshold or query_delta > 0:
+                flag = '  <-- regression'
+                regressions.append(f'{size}/{name}')
+            print(f'  {size:>6} {name:32} p95 x{ratio:5.2f}  queries {query_delta:+.1f}{flag}')
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Attendance tracker performance benchmarks')
+    parser.add_argument('--sizes', default='100,1000', help='Comma-separated employee counts')
+    parser.add_argument('--months', type=int, default=3, help='Months of attendance history')
+    parser.add_argument('--repeat', type=int, default=30, help='Requests per scenario')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Write results to this JSON file')
+    parser.add_argument('--compare', help='Baseline JSON file to compare against')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='p95 slowdown ratio reported as a regression')
+    args = parser.parse_args(argv)
+
+    # The app reads its configuration at import time
+    workdir = tempfile.mkdtemp(prefix='attendance-bench-')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    os.environ.setdefault('ACTIVITY_WRITER', 'sync')
+    os.environ.setdefault('SNAPSHOT_SCHEDULER', '0')
+    os.environ.setdefault('DASHBOARD_CACHE', 'memory')
+
+    results = {
+        'meta': {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'months': args.months,
+            'repeat': args.repeat,
+            'seed': args.seed,
+        },
+        'sizes': {},
+    }
+    for size in [int(size) for size in args.sizes.split(',')]:
+        results['sizes'][str(size)] = run_size(size, args.months, args.repeat, args.seed)
+    print_results(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'\nSaved results to {args.output}')
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f'\n{len(regressions)} regression(s): {", ".join(regressions)}')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,100 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+# Measures app start-up and per-worker memory, with and without PRELOAD:
+#
+#   python -m benchmarks.startup --workers 4
+#
+# Each mode runs in a fresh interpreter that times `import app` plus
+# create_app() and the first request, then forks workers the way a
+# preforking server does. Every worker serves a few pages and reports its
+# private (unshared) memory, which is what each extra worker really costs.
+# Private memory is read from /proc, so that part needs Linux.
+
+PAGES = ('/dashboard', '/employees', '/attendance')
+
+
+def private_kb():
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line)
+    except OSError:
+        return None
+    return sum(int(fields[name].split()[0]) for name in ('Private_Clean', 'Private_Dirty'))
+
+
+def run_worker(app, write_fd):
+    client = app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+    for path in PAGES:
+        client.get(path)
+    os.write(write_fd, json.dumps({'private_kb': private_kb()}).encode())
+    os._exit(0)
+
+
+def child(workers):
+    started = time.perf_counter()
+    from app import create_app
+    app = create_app()
+    startup = time.perf_counter() - started
+    runner = app.test_cli_runner()
+    runner.invoke(args=['upgrade-db'])
+    runner.invoke(args=['seed-db'])
+
+    started = time.perf_counter()
+    app.test_client().get('/login')
+    first_request = time.perf_counter() - started
+
+    result = {
+        'startup_ms': round(startup * 1000, 1),
+        'first_request_ms': round(first_request * 1000, 1),
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'worker_private_kb': [],
+    }
+    for _ in range(workers):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            run_worker(app, write_fd)
+        os.close(write_fd)
+        with os.fdopen(read_fd) as pipe:
+            report = json.loads(pipe.read() or '{}')
+        os.waitpid(pid, 0)
+        result['worker_private_kb'].append(report.get('private_kb'))
+    print(json.dumps(result))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='App start-up time and per-worker memory')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        return child(args.workers)
+
+    workdir = tempfile.mkdtemp(prefix='attendance-startup-')
+    print(f'{"mode":8} {"startup ms":>11} {"1st req ms":>11} {"max RSS MB":>11} {"worker private MB":>18}')
+    for mode, preload in (('lazy', '0'), ('preload', '1')):
+        env = dict(os.environ, PRELOAD=preload, ACTIVITY_WRITER='sync',
+                   DATABASE_URL='sqlite:///' + os.path.join(workdir, f'{mode}.db'))
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.startup', '--child', '--workers', str(args.workers)],
+            env=env, capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        private = [kb for kb in result['worker_private_kb'] if kb is not None]
+        worker = f'{sum(private) / len(private) / 1024:.1f}' if private else 'n/a'
+        print(f'{mode:8} {result["startup_ms"]:11.1f} {result["first_request_ms"]:11.1f} '
+              f'{result["max_rss_kb"] / 1024:11.1f} {worker:>18}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,325 @@
+import argparse
+import http.cookiejar
+import json
+import logging
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from benchmarks.run import percentile
+
+# Load test for the morning clock-in storm, against a real HTTP server:
+#
+#   python -m benchmarks.storm --users 2000 --concurrency 100 --rate 50
+#
+# Seeds N employees with the bulk generator (history up to yesterday, so
+# everyone can clock in today), serves the app from a separate process on
+# a threaded werkzeug server and sends every employee through
+#
+#   login -> attendance -> clock-in -> attendance -> clock-out
+#
+# as a browser would, with its own cookies and the page's punch key. Users
+# arrive as a Poisson process at --rate per second (0: all at once), at
+# most --concurrency of them in flight. Reports throughput, latency
+# percentiles per step, errors and rejected punches, and lock contention:
+#
+#   - lock errors: statements that failed on a lock timeout or deadlock, as
+#     counted by the server (sql_errors_total{kind="lock"} on /metrics)
+#   - lock waits: row lock waits that blocked and then went ahead, from the
+#     database's own counters (InnoDB's Innodb_row_lock_waits and
+#     Innodb_row_lock_time); MySQL only, other databases don't count them
+#
+# Exits 1 if any request failed.
+
+STEPS = ('login', 'attendance', 'clock_in', 'clock_out')
+PUNCH_KEY = re.compile(r'name="punch_key" value="(\w+)"')
+SQL_ERRORS = re.compile(r'^sql_errors_total\{kind="([^"]*)"\} (\d+)', re.MULTILINE)
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    # Each step is timed on its own, so redirects are left to the flow
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class Session:
+    def __init__(self, base_url, timeout):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), NoRedirect()
+        )
+
+    def request(self, path, data=None):
+        # (status, body); HTTP errors are responses too
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        try:
+            with self.opener.open(self.base_url + path, body, timeout=self.timeout) as response:
+                return response.status, response.read().decode()
+        except urllib.error.HTTPError as error:
+            return error.code, error.read().decode(errors='replace')
+
+
+class Results:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.timings = {step: [] for step in STEPS}
+        self.errors = {}
+        self.rejected = {}
+        self.flows = 0
+
+    def record(self, step, seconds, error=None):
+        with self.lock:
+            self.timings[step].append(seconds * 1000)
+            if error:
+                key = f'{step}: {error}'
+                self.errors[key] = self.errors.get(key, 0) + 1
+
+    def reject(self, step):
+        with self.lock:
+            self.rejected[step] = self.rejected.get(step, 0) + 1
+
+
+def timed(results, step, session, path, data=None, expect=(200,)):
+    started = time.perf_counter()
+    try:
+        status, body = session.request(path, data)
+    except OSError as error:
+        results.record(step, time.perf_counter() - started, type(error).__name__)
+        return None
+    results.record(step, time.perf_counter() - started, None if status in expect else f'HTTP {status}')
+    return body if status in expect else None
+
+
+def punch(results, step, session, path, done_message):
+    # Loads the attendance page for its punch key, punches, and checks the
+    # outcome on the page the punch redirects to
+    page = timed(results, 'attendance', session, '/attendance')
+    if page is None:
+        return False
+    match = PUNCH_KEY.search(page)
+    if timed(results, step, session, path, {'punch_key': match.group(1) if match else ''},
+             expect=(302,)) is None:
+        return False
+    page = timed(results, 'attendance', session, '/attendance')
+    if page is None:
+        return False
+    if done_message not in page:
+        results.reject(step)
+    return True
+
+
+def flow(results, base_url, username, password, timeout):
+    session = Session(base_url, timeout)
+    if timed(results, 'login', session, '/login', {'username': username, 'password': password},
+             expect=(302,)) is None:
+        return
+    if not punch(results, 'clock_in', session, '/clock-in', 'Clocked in successfully'):
+        return
+    if not punch(results, 'clock_out', session, '/clock-out', 'Clocked out successfully'):
+        return
+    with results.lock:
+        results.flows += 1
+
+
+def sql_errors(base_url):
+    with urllib.request.urlopen(base_url + '/metrics', timeout=30) as response:
+        return {kind: int(count) for kind, count in SQL_ERRORS.findall(response.read().decode())}
+
+
+def lock_wait_counters(database_url):
+    # {'waits': n, 'wait_ms': total} so far, or None where the database
+    # doesn't count lock waits
+    from sqlalchemy import create_engine, text
+    from sqlalchemy.engine import make_url
+
+    if make_url(database_url).get_backend_name() != 'mysql':
+        return None
+    engine = create_engine(database_url)
+    try:
+        with engine.connect() as connection:
+            status = dict(connection.execute(text(
+                "SHOW GLOBAL STATUS WHERE Variable_name IN ('Innodb_row_lock_waits', 'Innodb_row_lock_time')"
+            )).all())
+    finally:
+        engine.dispose()
+    return {'waits': int(status['Innodb_row_lock_waits']), 'wait_ms': int(status['Innodb_row_lock_time'])}
+
+
+def seed(users, history_months, seed_value):
+    from app import create_app
+    from benchmarks import datagen
+    from extensions import db
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        generated = datagen.generate(db, employees=users, months=history_months, seed=seed_value,
+                                     today=date.today() - timedelta(days=1))
+        datagen.build_derived(app)
+        db.engine.dispose()
+    return generated['employees']
+
+
+def serve():
+    # Runs in the server process: picks a free port and reports it on stdout
+    from werkzeug.serving import make_server
+    from app import create_app
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, create_app(), threaded=True)
+    print(server.server_port, flush=True)
+    server.serve_forever()
+
+
+def start_server():
+    process = subprocess.Popen([sys.executable, '-m', 'benchmarks.storm', '--serve'],
+                               stdout=subprocess.PIPE, text=True)
+    port = int(process.stdout.readline())
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 30
+    while True:
+        try:
+            urllib.request.urlopen(base_url + '/login', timeout=5).close()
+            return process, base_url
+        except OSError:
+            if time.monotonic() > deadline:
+                process.kill()
+                raise
+            time.sleep(0.1)
+
+
+def report(results, elapsed, args, seconds_seeded, lock_waits, lock_errors, errors_delta):
+    requests = sum(len(timings) for timings in results.timings.values())
+    failed = sum(results.errors.values())
+    summary = {
+        'users': args.users,
+        'concurrency': args.concurrency,
+        'rate': args.rate,
+        'seed_seconds': round(seconds_seeded, 2),
+        'elapsed_seconds': round(elapsed, 2),
+        'completed_flows': results.flows,
+        'flows_per_second': round(results.flows / elapsed, 2),
+        'requests': requests,
+        'requests_per_second': round(requests / elapsed, 2),
+        'error_rate': round(failed / requests, 4) if requests else 0.0,
+        'errors': dict(sorted(results.errors.items())),
+        'rejected_punches': results.rejected,
+        'lock_waits': lock_waits,
+        'lock_errors': lock_errors,
+        'sql_errors': errors_delta,
+        'steps': {},
+    }
+    for step, timings in results.timings.items():
+        timings = sorted(timings)
+        summary['steps'][step] = {
+            'requests': len(timings),
+            'p50_ms': round(percentile(timings, 0.50), 2),
+            'p95_ms': round(percentile(timings, 0.95), 2),
+            'p99_ms': round(percentile(timings, 0.99), 2),
+        }
+
+    print(f'\n{args.users} users, concurrency {args.concurrency}, '
+          f'arrivals {args.rate or "all at once"}{"/s" if args.rate else ""} '
+          f'(seeded in {summary["seed_seconds"]}s)')
+    print(f'  {results.flows} flows completed in {summary["elapsed_seconds"]}s: '
+          f'{summary["flows_per_second"]} flows/s, {summary["requests_per_second"]} requests/s')
+    print(f'  {"step":12} {"requests":>9} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9}')
+    for step, stats in summary['steps'].items():
+        print(f'  {step:12} {stats["requests"]:9} {stats["p50_ms"]:9.2f} '
+              f'{stats["p95_ms"]:9.2f} {stats["p99_ms"]:9.2f}')
+    print(f'  error rate {summary["error_rate"]:.2%} ({failed} of {requests} requests)')
+    for error, count in summary['errors'].items():
+        print(f'    {error}: {count}')
+    for step, count in results.rejected.items():
+        print(f'  rejected {step}: {count}')
+    if lock_waits is None:
+        print('  lock waits: not counted by this database')
+    else:
+        print(f'  lock waits: {lock_waits["waits"]} ({lock_waits["wait_ms"]} ms waiting)')
+    print(f'  lock errors: {lock_errors}' + (f', other SQL errors: {errors_delta}' if errors_delta else ''))
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Morning clock-in storm load test')
+    parser.add_argument('--users', type=int, default=500, help='Employees seeded, one session each')
+    parser.add_argument('--concurrency', type=int, default=50, help='Sessions in flight at most')
+    parser.add_argument('--rate', type=float, default=0,
+                        help='Mean arrivals per second (Poisson); 0 starts everyone at once')
+    parser.add_argument('--history-months', type=int, default=1, help='Months of attendance seeded')
+    parser.add_argument('--timeout', type=float, default=60, help='Seconds before a request fails')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Write results to this JSON file')
+    parser.add_argument('--database-url',
+                        help='Seed and load-test this database instead of a temporary SQLite file. '
+                             'DESTRUCTIVE: it gets thousands of fake accounts with a known password')
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.serve:
+        serve()
+        return 0
+
+    # Inherited by the server process; the app reads them at start-up. The
+    # database the shell points at is never used: seeding fills it with fake
+    # accounts whose password is datagen.PASSWORD.
+    workdir = tempfile.mkdtemp(prefix='attendance-storm-')
+    os.environ['DATABASE_URL'] = args.database_url or 'sqlite:///' + os.path.join(workdir, 'storm.db')
+    os.environ.pop('DATABASE_REPLICA_URL', None)
+    os.environ.setdefault('SNAPSHOT_SCHEDULER', '0')
+    os.environ.pop('METRICS_TOKEN', None)
+
+    from benchmarks import datagen
+
+    started = time.perf_counter()
+    usernames = seed(args.users, args.history_months, args.seed)
+    seconds_seeded = time.perf_counter() - started
+
+    process, base_url = start_server()
+    try:
+        before = sql_errors(base_url)
+        waits_before = lock_wait_counters(os.environ['DATABASE_URL'])
+        results = Results()
+        rng = random.Random(args.seed)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            arrival = started
+            for username in usernames:
+                if args.rate:
+                    arrival += rng.expovariate(args.rate)
+                    time.sleep(max(0.0, arrival - time.perf_counter()))
+                pool.submit(flow, results, base_url, username, datagen.PASSWORD, args.timeout)
+        elapsed = time.perf_counter() - started
+        after = sql_errors(base_url)
+        waits_after = lock_wait_counters(os.environ['DATABASE_URL'])
+    finally:
+        process.terminate()
+        process.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    delta = {kind: count - before.get(kind, 0) for kind, count in after.items() if count != before.get(kind, 0)}
+    lock_waits = None
+    if waits_before is not None:
+        lock_waits = {name: waits_after[name] - waits_before[name] for name in waits_before}
+    summary = report(results, elapsed, args, seconds_seeded, lock_waits, delta.pop('lock', 0), delta)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summary, f, indent=2)
+        print(f'\nSaved results to {args.output}')
+    return 1 if results.errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,177 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+
+# Small key/value caches for computed page data. Both backends share the
+# same interface (get/set/delete/clear/stats) so callers can swap them:
+#
+#   MemoryCache - per-process LRU with TTL, the default
+#   FileCache   - SQLite file shared by every worker process on the host
+#
+# FileCache stores JSON, not pickles, so whoever can write the file can't
+# run code in the app. Its values are limited to JSON types plus dates and
+# datetimes (tuples come back as lists).
+
+
+class BaseCache:
+    def __init__(self, default_ttl=60):
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def _count(self, hit):
+        with self._stats_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get_or_set(self, key, loader, ttl=None):
+        value = self.get(key)
+        if value is None:
+            value = loader()
+            self.set(key, value, ttl)
+        return value
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'backend': type(self).__name__,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+class MemoryCache(BaseCache):
+    def __init__(self, max_entries=256, default_ttl=60):
+        super().__init__(default_ttl)
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        self._count(entry is not None)
+        return entry[1] if entry is not None else None
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + (ttl or self.default_ttl)
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        stats = super().stats()
+        stats['entries'] = len(self._entries)
+        return stats
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {'__datetime__': value.isoformat()}
+    if isinstance(value, date):
+        return {'__date__': value.isoformat()}
+    raise TypeError(f'{type(value).__name__} can not be stored in a FileCache')
+
+
+def _decode(obj):
+    if '__datetime__' in obj:
+        return datetime.fromisoformat(obj['__datetime__'])
+    if '__date__' in obj:
+        return date.fromisoformat(obj['__date__'])
+    return obj
+
+
+def _open_private(path):
+    # Creates the file readable by its owner only; refuses one owned by
+    # another user, and takes away other users' access to our own
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    os.close(os.open(path, os.O_RDWR | os.O_CREAT, 0o600))
+    info = os.stat(path)
+    if hasattr(os, 'getuid') and info.st_uid != os.getuid():
+        raise RuntimeError(f'Cache file {path} is owned by another user')
+    if info.st_mode & 0o077:
+        os.chmod(path, 0o600)
+
+
+class FileCache(BaseCache):
+    def __init__(self, path, default_ttl=60):
+        super().__init__(default_ttl)
+        self.path = path
+        self._local = threading.local()
+        _open_private(path)
+        with self._connect() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache '
+                '(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL)'
+            )
+
+    def _connect(self):
+        # One connection per thread; sqlite3 connections can't be shared
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            self._local.connection = connection
+        return connection
+
+    def get(self, key):
+        row = self._connect().execute(
+            'SELECT value FROM cache WHERE key = ? AND expires > ?', (key, time.time())
+        ).fetchone()
+        if row is not None:
+            try:
+                value = json.loads(row[0], object_hook=_decode)
+            except ValueError:
+                # Not written by this version (e.g. an old pickle): a miss
+                row = None
+        self._count(row is not None)
+        return value if row is not None else None
+
+    def set(self, key, value, ttl=None):
+        connection = self._connect()
+        now = time.time()
+        connection.execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)',
+            (key, json.dumps(value, default=_encode), now + (ttl or self.default_ttl))
+        )
+        connection.execute('DELETE FROM cache WHERE expires <= ?', (now,))
+
+    def delete(self, *keys):
+        if keys:
+            self._connect().executemany('DELETE FROM cache WHERE key = ?', [(key,) for key in keys])
+
+    def clear(self):
+        self._connect().execute('DELETE FROM cache')
+
+
+def make_cache(backend='memory', path=None, default_ttl=60, max_entries=256):
+    if backend == 'file':
+        return FileCache(path, default_ttl=default_ttl)
+    if backend == 'memory':
+        return MemoryCache(max_entries=max_entries, default_ttl=default_ttl)
+    raise ValueError(f'Unknown cache backend: {backend}')
@@ -0,0 +1,344 @@
+from datetime import datetime, date, timedelta
+
+import click
+from flask import Blueprint, current_app
+from sqlalchemy import func, or_
+
+import attendance_export
+import migrations
+import snapshots
+from extensions import db
+from models import (User, Employee, Department, DepartmentAlias, Attendance, AttendanceArchive,
+                    AttendanceMonthlySummary, Activity, ActivityArchive, ActivityDailyCount, DataVersion,
+                    EmployeeSearchTrigram, COMPACTED_ACTIVITY_TYPES, DEFAULT_DEPARTMENT_ALIASES, employee_trigram_rows, attendance_union, hot_window_start,
+                    month_range, normalize_department, invalidate_dashboard)
+from views.attendance import attendance_export_rows, parse_export_range
+from views.employees import import_employees
+
+# Maintenance commands, registered on the app as `flask <command>`
+bp = Blueprint('commands', __name__, cli_group=None)
+
+@bp.cli.command('upgrade-db')
+def upgrade_db():
+    # Create missing tables, then apply pending index/column migrations
+    db.create_all()
+    with db.engine.begin() as connection:
+        applied = migrations.upgrade(connection, echo=click.echo)
+    click.echo(f'Applied {len(applied)} migration(s).')
+
+def hot_path_queries():
+    # The per-request attendance and activity queries that must stay indexed
+    today = date.today()
+    start_of_month = today.replace(day=1)
+    return {
+        'is_present / clock_out': Attendance.query.filter(
+            Attendance.employee_id == 1,
+            Attendance.date == today,
+            Attendance.clock_out.is_(None)
+        ),
+        'clock_in (first of day)': Attendance.query.filter(
+            Attendance.employee_id == 1,
+            Attendance.date == today,
+            Attendance.id != 1
+        ),
+        'clock_out': Attendance.query.filter(
+            Attendance.employee_id == 1,
+            Attendance.open_day == today
+        ),
+        'punch replay': Attendance.query.filter(Attendance.employee_id == 1, Attendance.clock_in_key == 'key'),
+        'attendance month view': Attendance.query.filter(
+            Attendance.employee_id == 1,
+            Attendance.date >= start_of_month,
+            Attendance.date < today + timedelta(days=1)
+        ).order_by(Attendance.date.desc()),
+        'attendance today (HR)': Attendance.query.filter(Attendance.date == today),
+        'dashboard present_today': Attendance.query.filter(
+            Attendance.date == today,
+            Attendance.clock_out.is_(None)
+        ).with_entities(func.count()),
+        'dashboard recent activities': Activity.query.order_by(Activity.timestamp.desc(), Activity.id.desc()).limit(10),
+        'activity timeline page': Activity.query.filter(
+            Activity.timestamp <= today,
+            or_(Activity.timestamp < today, Activity.id < 1)
+        ).order_by(Activity.timestamp.desc(), Activity.id.desc()).limit(51),
+        'activity timeline by type': Activity.query.filter(Activity.type == 'clock_in').order_by(
+            Activity.timestamp.desc(), Activity.id.desc()).limit(51),
+        'activity timeline by user': Activity.query.filter(Activity.user_id == 1).order_by(
+            Activity.timestamp.desc(), Activity.id.desc()).limit(51),
+        'activity compaction batch': Activity.query.filter(
+            Activity.type.in_(COMPACTED_ACTIVITY_TYPES), Activity.timestamp < today
+        ).limit(5000),
+    }
+
+@bp.cli.command('check-query-plans')
+def check_query_plans():
+    # EXPLAIN the hot-path queries against an in-memory SQLite copy of the
+    # schema and fail if any of them has to scan a whole table
+    engine = db.create_engine('sqlite://')
+    db.metadata.create_all(engine)
+    full_scans = []
+    with engine.connect() as connection:
+        for name, query in hot_path_queries().items():
+            compiled = query.statement.compile(dialect=engine.dialect, compile_kwargs={'render_postcompile': True})
+            params = compiled.construct_params()
+            args = tuple(params[key] for key in compiled.positiontup)
+            plan = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}', args).all()
+            details = [row[-1] for row in plan]
+            click.echo(f'{name}: {"; ".join(details)}')
+            for detail in details:
+                if detail.startswith('SCAN ') and 'USING' not in detail:
+                    full_scans.append(f'{name}: {detail}')
+    engine.dispose()
+    if full_scans:
+        raise click.ClickException('Full table scans found:\n' + '\n'.join(full_scans))
+    click.echo('All hot-path queries use an index.')
+
+@bp.cli.command('rebuild-search-index')
+def rebuild_search_index():
+    # Rebuild EmployeeSearchTrigram from scratch, e.g. after a bulk load
+    EmployeeSearchTrigram.query.delete(synchronize_session=False)
+    total = 0
+    rows = []
+    employees = db.session.query(Employee.id, Employee.name, Employee.department, Employee.position)
+    for employee_id, name, department, position in employees.yield_per(1000):
+        rows.extend(employee_trigram_rows(employee_id, name, department, position))
+        total += 1
+        if len(rows) >= 10000:
+            db.session.execute(EmployeeSearchTrigram.__table__.insert(), rows)
+            rows = []
+    if rows:
+        db.session.execute(EmployeeSearchTrigram.__table__.insert(), rows)
+    db.session.commit()
+    click.echo(f'Indexed {total} employees.')
+
+@bp.cli.command('import-employees')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='Defaults to the file extension.')
+@click.option('--chunk-size', default=1000, show_default=True)
+@click.option('--workers', type=int, help='Password hashing processes; defaults to the CPU count.')
+def import_employees_command(path, fmt, chunk_size, workers):
+    fmt = fmt or ('jsonl' if path.lower().endswith(('.jsonl', '.ndjson')) else 'csv')
+    admin = User.query.filter_by(role='admin').first()
+    with open(path, encoding='utf-8-sig', newline='') as stream:
+        report = import_employees(stream, fmt, admin.id if admin else None,
+                                  chunk_size=chunk_size, workers=workers)
+    for line, message in report.errors:
+        click.echo(f'line {line}: {message}', err=True)
+    click.echo(report.summary())
+
+@bp.cli.command('export-attendance')
+@click.option('--start', help='First day (YYYY-MM-DD); defaults to the start of this month.')
+@click.option('--end', help='Last day (YYYY-MM-DD); defaults to today.')
+@click.option('--department', default='')
+@click.option('--format', 'fmt', type=click.Choice(sorted(attendance_export.FORMATS)), default='csv', show_default=True)
+@click.option('--output', type=click.File('wb'), default='-', help='Defaults to stdout.')
+def export_attendance_command(start, end, department, fmt, output):
+    start_date, end_date = parse_export_range(start, end)
+    writer, _ = attendance_export.FORMATS[fmt]
+    for chunk in writer(attendance_export_rows(start_date, end_date, department)):
+        output.write(chunk)
+
+def move_rows(source, archive, condition, batch_size):
+    # Copy rows matching condition into the archive table and delete them
+    # from the hot table, one bounded batch per transaction
+    # The archive keeps the record columns, not the hot-path bookkeeping
+    # (open-session marker, idempotency keys)
+    columns = [column.name for column in archive.__table__.columns]
+    moved = 0
+    while True:
+        ids = [row_id for (row_id,) in db.session.query(source.id).filter(condition)
+               .order_by(source.id).limit(batch_size)]
+        if not ids:
+            return moved
+        db.session.execute(archive.__table__.insert().from_select(
+            columns,
+            db.select(*[source.__table__.c[column] for column in columns]).where(source.id.in_(ids))
+        ))
+        db.session.execute(source.__table__.delete().where(source.id.in_(ids)))
+        db.session.commit()
+        moved += len(ids)
+
+@bp.cli.command('archive-history')
+@click.option('--keep-months', type=int, help='Months to keep in the hot tables, including the current one.')
+@click.option('--batch-size', default=5000, show_default=True)
+def archive_history(keep_months, batch_size):
+    # Move attendance and activity from closed months out of the hot tables
+    if keep_months:
+        current_app.config['ARCHIVE_KEEP_MONTHS'] = keep_months
+    cutoff = hot_window_start()
+    attendance_moved = move_rows(Attendance, AttendanceArchive, Attendance.date < cutoff, batch_size)
+    activity_moved = move_rows(
+        Activity, ActivityArchive, Activity.timestamp < datetime.combine(cutoff, datetime.min.time()), batch_size
+    )
+    click.echo(f'Archived {attendance_moved} attendance and {activity_moved} activity rows '
+               f'from before {cutoff.isoformat()}.')
+
+def compact_rows(model, cutoff, batch_size):
+    # Count punch activity older than cutoff into ActivityDailyCount and
+    # delete it, one bounded batch per transaction, so the counts and the
+    # deletes always land together
+    compacted = 0
+    while True:
+        rows = db.session.query(model.id, model.type, model.timestamp).filter(
+            model.type.in_(COMPACTED_ACTIVITY_TYPES), model.timestamp < cutoff
+        ).limit(batch_size).all()
+        if not rows:
+            return compacted
+        counts = {}
+        for _, type, timestamp in rows:
+            counts[(timestamp.date(), type)] = counts.get((timestamp.date(), type), 0) + 1
+        for (day, type), count in counts.items():
+            ActivityDailyCount.add(day, type, count)
+        db.session.execute(model.__table__.delete().where(model.id.in_([row.id for row in rows])))
+        db.session.commit()
+        compacted += len(rows)
+
+@bp.cli.command('compact-activity')
+@click.option('--keep-days', type=int, help='Days of raw punch activity to keep; defaults to ACTIVITY_RETENTION_DAYS.')
+@click.option('--batch-size', default=5000, show_default=True)
+def compact_activity(keep_days, batch_size):
+    # Replace clock_in/clock_out activity past the retention window, in the
+    # hot table and the archive, with per-day counts. Other activity types
+    # are rare and kept as they are.
+    keep_days = keep_days or current_app.config['ACTIVITY_RETENTION_DAYS']
+    cutoff = datetime.combine(date.today() - timedelta(days=keep_days), datetime.min.time())
+    compacted = sum(compact_rows(model, cutoff, batch_size) for model in (Activity, ActivityArchive))
+    click.echo(f'Compacted {compacted} punch activity rows from before {cutoff.date().isoformat()} '
+               f'into daily counts.')
+
+@bp.cli.command('rebuild-attendance-summary')
+@click.option('--month', help='Only rebuild this month (YYYY-MM); defaults to all history.')
+def rebuild_attendance_summary(month):
+    # Backfill AttendanceMonthlySummary from the raw Attendance rows,
+    # archived months included
+    summaries = AttendanceMonthlySummary.query
+    start_date = end_date = None
+    if month:
+        start_date, end_date = month_range(month)
+        end_date -= timedelta(days=1)
+        summaries = summaries.filter(AttendanceMonthlySummary.month == start_date)
+    records = attendance_union('employee_id', 'date', 'clock_in', 'clock_out',
+                               start_date=start_date, end_date=end_date)
+    query = db.session.query(records.c.employee_id, records.c.date, records.c.clock_in, records.c.clock_out)
+
+    totals = {}
+    seen_days = set()
+    for employee_id, day, clock_in, clock_out in query.yield_per(5000):
+        key = (employee_id, day.replace(day=1))
+        row = totals.setdefault(key, {'days_present': 0, 'closed_sessions': 0, 'total_seconds': 0})
+        if (employee_id, day) not in seen_days:
+            seen_days.add((employee_id, day))
+            row['days_present'] += 1
+        if clock_out is not None:
+            row['closed_sessions'] += 1
+            row['total_seconds'] += (clock_out - clock_in).total_seconds()
+
+    summaries.delete(synchronize_session=False)
+    db.session.bulk_insert_mappings(AttendanceMonthlySummary, [
+        dict(employee_id=employee_id, month=month_start,
+             days_present=row['days_present'],
+             closed_sessions=row['closed_sessions'],
+             total_seconds=int(round(row['total_seconds'])))
+        for (employee_id, month_start), row in totals.items()
+    ])
+    # The directory shows these totals
+    DataVersion.bump('attendance')
+    db.session.commit()
+    click.echo(f'Rebuilt {len(totals)} monthly attendance summaries.')
+
+@bp.cli.command('repair-departments')
+def repair_departments():
+    # Canonicalize Employee.department through the aliases, then recompute
+    # every department's headcount and salary total from the employee table
+    for alias, name in DEFAULT_DEPARTMENT_ALIASES.items():
+        department = Department.query.filter_by(name=name).first()
+        if department is None:
+            department = Department(name=name, headcount=0, salary_sum=0)
+            db.session.add(department)
+            db.session.flush()
+        if db.session.get(DepartmentAlias, alias) is None:
+            db.session.add(DepartmentAlias(alias=alias, department_id=department.id))
+    db.session.flush()
+
+    renamed = 0
+    for (spelling,) in db.session.query(Employee.department).distinct().all():
+        canonical = normalize_department(spelling)
+        if canonical == spelling:
+            continue
+        # Through the ORM so the search index follows the new name
+        for employee in Employee.query.filter_by(department=spelling):
+            employee.department = canonical
+            renamed += 1
+    db.session.flush()
+
+    totals = {
+        name: (headcount, salary_sum or 0)
+        for name, headcount, salary_sum in db.session.query(
+            Employee.department, func.count(Employee.id), func.sum(Employee.salary)
+        ).group_by(Employee.department)
+    }
+    fixed = 0
+    for department in Department.query.populate_existing().all():
+        headcount, salary_sum = totals.pop(department.name, (0, 0))
+        if department.headcount != headcount or abs(department.salary_sum - salary_sum) > 0.005:
+            click.echo(f'{department.name}: headcount {department.headcount} -> {headcount}, '
+                       f'salary total {department.salary_sum:.2f} -> {salary_sum:.2f}')
+            fixed += 1
+        department.headcount = headcount
+        department.salary_sum = salary_sum
+        if not headcount and not department.aliases:
+            db.session.delete(department)
+    for name, (headcount, salary_sum) in totals.items():
+        click.echo(f'{name}: created with headcount {headcount}')
+        db.session.add(Department(name=name, headcount=headcount, salary_sum=salary_sum))
+        fixed += 1
+    DataVersion.bump('employees')
+    db.session.commit()
+    invalidate_dashboard('employees')
+    click.echo(f'Renamed {renamed} employee departments; repaired {fixed} departments.')
+
+@bp.cli.command('snapshot-days')
+@click.option('--start', help='First day to rewrite (YYYY-MM-DD).')
+@click.option('--end', help='Last day to rewrite (YYYY-MM-DD); defaults to the last closed day.')
+def snapshot_days(start, end):
+    # Without options, writes every day missed since the latest snapshot
+    # (what the in-process scheduler does, for running from cron instead);
+    # with --start, rewrites that range, e.g. after correcting attendance
+    if start:
+        start_date = date.fromisoformat(start)
+        end_date = date.fromisoformat(end) if end else snapshots.last_closed_day(
+            snapshots.parse_time(current_app.config['SNAPSHOT_AT']))
+        if start_date > end_date:
+            raise click.BadParameter('--start is after --end')
+    else:
+        due = snapshots.due_range(current_app)
+        if due is None:
+            click.echo('Daily snapshots are up to date.')
+            return
+        start_date, end_date = due
+    written = snapshots.materialize(start_date, end_date)
+    click.echo(f'Wrote {written} daily snapshot rows for {start_date.isoformat()}..{end_date.isoformat()}.')
+
+@bp.cli.command('seed-db')
+def seed_db():
+    # Create the default admin and HR accounts if they don't exist yet
+    defaults = [
+        ('admin', 'admin123', 'admin', 'System Administrator', 'Administration', 'System Administrator', 80000),
+        ('hr', 'hr123', 'hr', 'HR Manager', 'Human Resources', 'HR Manager', 60000),
+    ]
+    for username, password, role, name, department, position, salary in defaults:
+        if User.query.filter_by(username=username).first():
+            continue
+        user = User(username=username, role=role)
+        user.set_password(password)
+        db.session.add(user)
+        db.session.flush()  # Get the user ID
+        db.session.add(Employee(
+            name=name,
+            department=department,
+            position=position,
+            salary=salary,
+            user_id=user.id
+        ))
+        click.echo(f'Created {role} user {username!r}.')
+    db.session.commit()
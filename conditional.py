@@ -0,0 +1,81 @@
+import hashlib
+from datetime import date, datetime, time, timezone
+from functools import wraps
+
+from flask import g, request, session, make_response
+from flask_login import current_user
+from markupsafe import Markup
+
+from extensions import fragment_cache
+from models import DataVersion
+
+# Conditional GET and fragment caching driven by the DataVersion counters.
+# Write routes bump the counters of what they change (DataVersion.bump, in
+# their own transaction); read views declare the counters they depend on:
+#
+#   @bp.route('/employees')
+#   @login_required
+#   @replica_reads
+#   @conditional(lambda: ['employees', 'attendance'])
+#   def employees(): ...
+#
+# The ETag digests the URL, the user, the day and those versions, so a
+# browser revalidating an unchanged page gets a 304 after one small query,
+# without the view running. fragment() caches rendered pieces of a page
+# under the versions they were rendered from, shared by every user who
+# would see the same HTML.
+
+
+def digest(*parts):
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:24]
+
+
+def versions(keys):
+    # ({key: version}, last modified): the latest bump, but never before
+    # today's midnight, since every page here shows something about today
+    state = DataVersion.current(keys)
+    midnight = datetime.combine(date.today(), time()).astimezone(timezone.utc)
+    bumped = [moment.replace(tzinfo=timezone.utc) for _, moment in state.values() if moment is not None]
+    return {key: version for key, (version, _) in state.items()}, max(bumped + [midnight])
+
+
+def conditional(keys):
+    # `keys` is called per request (it may depend on the user) and returns
+    # the DataVersion keys the view's response depends on
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            current, last_modified = versions(keys())
+            g.data_versions = current
+            if '_flashes' in session:
+                # The page has to show the message, so it can't be a 304
+                return view(*args, **kwargs)
+            etag = digest(request.full_path, current_user.get_id(), current_user.role,
+                          date.today().isoformat(), sorted(current.items()))
+            # Only the ETag is trusted: Last-Modified can't tell two users
+            # (or two query strings) apart
+            if request.if_none_match.contains(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.last_modified = last_modified
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            response.vary.add('Cookie')
+            return response
+        return wrapper
+    return decorator
+
+
+def current_versions():
+    # The versions read by @conditional for this request
+    return g.data_versions
+
+
+def fragment(name, key, render):
+    # Rendered HTML for `name`, cached under everything it depends on
+    # (`key`, which must include the relevant versions)
+    return Markup(fragment_cache.get_or_set(f'fragment:{name}:{digest(key)}', lambda: str(render())))
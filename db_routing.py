@@ -0,0 +1,97 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from flask import current_app, has_request_context, session as cookie_session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+# Connection pool settings and read/write routing between the primary
+# database and an optional read replica (the 'replica' bind).
+#
+# Everything goes to the primary unless it runs inside use_replica() (or a
+# view decorated with @replica_reads) and is a plain SELECT. Flushes, DML
+# statements, SELECT ... FOR UPDATE and anything in a session that has
+# already written stay on the primary. After a request commits a write, its browser session
+# is pinned to the primary for `read_your_writes` seconds, so the page shown
+# after a punch never comes from a replica that hasn't caught up yet.
+
+REPLICA = 'replica'
+
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+def engine_options(url, pool_size=10, max_overflow=20, pool_timeout=10, pool_recycle=1800, pre_ping=True):
+    # create_engine() arguments for one database URL
+    options = {'pool_pre_ping': pre_ping, 'pool_recycle': pool_recycle}
+    if make_url(url).get_backend_name() != 'sqlite':
+        # SQLite's default pools don't take sizing arguments
+        options.update(pool_size=pool_size, max_overflow=max_overflow, pool_timeout=pool_timeout)
+    return options
+
+
+@contextmanager
+def use_replica():
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def replica_reads(view):
+    # For read-only views: their SELECTs may be served by the replica
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        with use_replica():
+            return view(*args, **kwargs)
+    return wrapper
+
+
+def pinned_to_primary():
+    return has_request_context() and cookie_session.get('primary_until', 0) > time.time()
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._db.engines.get(REPLICA) is not None and self._reads_from_replica(clause):
+            return self._db.engines[REPLICA]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _reads_from_replica(self, clause):
+        if not _replica_reads.get() or self._flushing or self.info.get('wrote'):
+            return False
+        if clause is None or not getattr(clause, 'is_select', False):
+            return False
+        if getattr(clause, '_for_update_arg', None) is not None:
+            return False
+        return not pinned_to_primary()
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _remember_write(session, flush_context):
+    session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _remember_statement_write(orm_execute_state):
+    # UPDATE/INSERT/DELETE run through session.execute() never flush, but
+    # they write all the same (Attendance.close, the counter bumps)
+    if orm_execute_state.is_update or orm_execute_state.is_insert or orm_execute_state.is_delete:
+        orm_execute_state.session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _pin_after_write(session):
+    if session.info.get('wrote') and has_request_context():
+        window = current_app.config.get('READ_YOUR_WRITES_SECONDS', 5)
+        if window:
+            cookie_session['primary_until'] = time.time() + window
+
+
+@event.listens_for(RoutingSession, 'after_transaction_end')
+def _reset_write_flag(session, transaction):
+    if transaction.parent is None:
+        session.info.pop('wrote', None)
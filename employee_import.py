@@ -0,0 +1,109 @@
+import csv
+import io
+import json
+import os
+import time
+from itertools import islice
+
+from werkzeug.security import generate_password_hash
+
+# Streaming pieces of the bulk employee import (`flask import-employees` and
+# /import_employees). The database side lives in views.employees.import_employees().
+
+REQUIRED_FIELDS = ('name', 'department', 'position', 'salary', 'username', 'password')
+MAX_REPORTED_ERRORS = 500
+
+
+class ImportReport:
+    def __init__(self):
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+        self.started = time.monotonic()
+        self.elapsed = 0.0
+
+    def error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+    def finish(self):
+        self.elapsed = time.monotonic() - self.started
+        return self
+
+    @property
+    def rows_per_second(self):
+        return round((self.imported + self.failed) / self.elapsed, 1) if self.elapsed else 0.0
+
+    def summary(self):
+        return (f'Imported {self.imported} employees, {self.failed} failed, '
+                f'in {self.elapsed:.1f}s ({self.rows_per_second} rows/s)')
+
+
+def read_rows(stream, fmt):
+    # Yields (line number, dict) without reading the whole file; `stream`
+    # may be binary (uploads) or text (open files)
+    if isinstance(stream, io.TextIOBase):
+        text = stream
+    else:
+        text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == 'jsonl':
+        for line_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield line_number, row if isinstance(row, dict) else None
+    else:
+        raise ValueError(f'Unsupported import format: {fmt}')
+
+
+def validate_row(row):
+    # Returns (clean row, error message)
+    if row is None:
+        return None, 'not a JSON object'
+    missing = [field for field in REQUIRED_FIELDS if not str(row.get(field) or '').strip()]
+    if missing:
+        return None, f'missing {", ".join(missing)}'
+    try:
+        salary = float(row['salary'])
+    except (TypeError, ValueError):
+        return None, 'salary must be a number'
+    return {
+        'name': str(row['name']).strip(),
+        'department': str(row['department']).strip(),
+        'position': str(row['position']).strip(),
+        'salary': salary,
+        'username': str(row['username']).strip(),
+        'password': str(row['password']),
+    }, None
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def password_hasher(workers=None):
+    # Hashing dominates the import, so it runs in a process pool (every core
+    # by default); imported here so web workers that never import anything
+    # don't load multiprocessing. spawn, like reports.py, so the pool doesn't
+    # inherit an upload request's threads and locks.
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+
+def hash_passwords(pool, passwords):
+    chunksize = max(1, len(passwords) // ((os.cpu_count() or 1) * 4))
+    return list(pool.map(generate_password_hash, passwords, chunksize=chunksize))
@@ -0,0 +1,29 @@
+from flask import current_app
+from flask_login import LoginManager
+from flask_sqlalchemy import SQLAlchemy
+from werkzeug.local import LocalProxy
+
+import db_routing
+
+# Extension objects shared by the models, views and commands. db and
+# login_manager are bound to an app in create_app(); the per-app services
+# (caches, metrics, background workers) are built there too and reached
+# through these proxies, which resolve against current_app.
+
+db = SQLAlchemy(session_options={'class_': db_routing.RoutingSession})
+login_manager = LoginManager()
+login_manager.login_view = 'auth.login'
+
+
+def _service(name):
+    return LocalProxy(lambda: current_app.extensions['attendance'][name])
+
+
+dashboard_cache = _service('dashboard_cache')
+identity_cache = _service('identity_cache')
+metrics = _service('metrics')
+presence = _service('presence')
+report_jobs = _service('report_jobs')
+activity_writer = _service('activity_writer')
+analytics_cache = _service('analytics_cache')
+fragment_cache = _service('fragment_cache')
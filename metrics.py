@@ -0,0 +1,158 @@
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+from flask import g, request
+from sqlalchemy import event
+
+# Request and SQL instrumentation exported in Prometheus text format.
+#
+# Flask request hooks time every request and SQLAlchemy engine events time
+# every statement. Everything is aggregated in process into fixed-bucket
+# histograms and counters under one lock, so the per-request overhead is a
+# few dictionary updates. When `slow_request_ms` is set, slower requests are
+# logged as one JSON line each; the slowest statements are kept as samples.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+SLOW_QUERY_SAMPLES = 20
+
+slow_request_log = logging.getLogger('attendancetracker.slow_requests')
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Metrics:
+    def __init__(self, slow_request_ms=None, slow_query_ms=100):
+        self.slow_request_ms = slow_request_ms
+        self.slow_query_ms = slow_query_ms
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.latency = {}
+        self.queries = {}
+        self.sql_seconds = {}
+        self.responses = {}
+        self.errors = {}
+        self.slow_queries = []
+
+    def init_app(self, app, db):
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        with app.app_context():
+            engines = list(db.engines.values())
+        # Primary and replica alike
+        for engine in engines:
+            event.listen(engine, 'before_cursor_execute', self._before_execute)
+            event.listen(engine, 'after_cursor_execute', self._after_execute)
+            event.listen(engine, 'handle_error', self._handle_error)
+
+    # SQLAlchemy hooks; statements run on the request's thread, so the
+    # running totals live in a thread local rather than on g
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self._local.started = time.perf_counter()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - getattr(self._local, 'started', time.perf_counter())
+        self._local.queries = getattr(self._local, 'queries', 0) + 1
+        self._local.sql_seconds = getattr(self._local, 'sql_seconds', 0.0) + elapsed
+        if elapsed * 1000 >= self.slow_query_ms:
+            with self._lock:
+                self.slow_queries.append((elapsed, ' '.join(statement.split())[:500]))
+                self.slow_queries.sort(reverse=True)
+                del self.slow_queries[SLOW_QUERY_SAMPLES:]
+
+    def _handle_error(self, context):
+        # Lock waits and deadlocks are what a punch storm runs into
+        name = type(context.original_exception).__name__
+        message = str(context.original_exception).lower()
+        kind = 'lock' if ('lock' in message or 'deadlock' in message) else name
+        with self._lock:
+            self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    # Flask hooks
+    def _before_request(self):
+        self._local.queries = 0
+        self._local.sql_seconds = 0.0
+        g.metrics_started = time.perf_counter()
+
+    def _after_request(self, response):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        endpoint = request.endpoint or 'unmatched'
+        queries = getattr(self._local, 'queries', 0)
+        sql_seconds = getattr(self._local, 'sql_seconds', 0.0)
+        with self._lock:
+            self.latency.setdefault(endpoint, Histogram(LATENCY_BUCKETS)).observe(elapsed)
+            self.queries.setdefault(endpoint, Histogram(QUERY_BUCKETS)).observe(queries)
+            self.sql_seconds[endpoint] = self.sql_seconds.get(endpoint, 0.0) + sql_seconds
+            key = (endpoint, response.status_code)
+            self.responses[key] = self.responses.get(key, 0) + 1
+        if self.slow_request_ms and elapsed * 1000 >= self.slow_request_ms:
+            slow_request_log.warning(json.dumps({
+                'endpoint': endpoint,
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'duration_ms': round(elapsed * 1000, 1),
+                'queries': queries,
+                'sql_ms': round(sql_seconds * 1000, 1),
+            }))
+        return response
+
+    def render(self):
+        lines = []
+        with self._lock:
+            self._histogram(lines, 'http_request_duration_seconds',
+                            'Request latency by endpoint.', self.latency)
+            self._histogram(lines, 'http_request_sql_queries',
+                            'SQL statements per request by endpoint.', self.queries)
+            lines.append('# HELP http_request_sql_seconds_total Time spent in SQL by endpoint.')
+            lines.append('# TYPE http_request_sql_seconds_total counter')
+            for endpoint, seconds in sorted(self.sql_seconds.items()):
+                lines.append(f'http_request_sql_seconds_total{{endpoint="{_escape(endpoint)}"}} {seconds:.6f}')
+            lines.append('# HELP http_responses_total Responses by endpoint and status code.')
+            lines.append('# TYPE http_responses_total counter')
+            for (endpoint, status), count in sorted(self.responses.items()):
+                lines.append(f'http_responses_total{{endpoint="{_escape(endpoint)}",status="{status}"}} {count}')
+            lines.append('# HELP sql_errors_total Database errors by kind (lock covers lock waits and deadlocks).')
+            lines.append('# TYPE sql_errors_total counter')
+            for kind, count in sorted(self.errors.items()):
+                lines.append(f'sql_errors_total{{kind="{_escape(kind)}"}} {count}')
+            lines.append('# HELP sql_slow_query_seconds Slowest statements seen by this process.')
+            lines.append('# TYPE sql_slow_query_seconds gauge')
+            for elapsed, statement in self.slow_queries:
+                lines.append(f'sql_slow_query_seconds{{statement="{_escape(statement)}"}} {elapsed:.6f}')
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _histogram(lines, name, help_text, histograms):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for endpoint, histogram in sorted(histograms.items()):
+            label = f'endpoint="{_escape(endpoint)}"'
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{label},le="+Inf"}} {histogram.count}')
+            lines.append(f'{name}_sum{{{label}}} {histogram.total:.6f}')
+            lines.append(f'{name}_count{{{label}}} {histogram.count}')
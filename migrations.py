@@ -0,0 +1,141 @@
+from datetime import datetime
+
+from sqlalchemy import Column, Date, DateTime, Index, MetaData, String, Table, inspect, text
+
+# Schema changes for databases created before a model gained a new index or
+# column. db.create_all() only creates missing tables, so every change to an
+# existing table gets a numbered step here. Steps must be idempotent: a fresh
+# database created by create_all() already has everything they add.
+#
+# Run with `flask --app app upgrade-db`.
+
+schema_migrations = Table(
+    'schema_migrations', MetaData(),
+    Column('revision', String(32), primary_key=True),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+
+def create_index(connection, table_name, index_name, columns, unique=False):
+    inspector = inspect(connection)
+    if not inspector.has_table(table_name):
+        return False
+    if any(index['name'] == index_name for index in inspector.get_indexes(table_name)):
+        return False
+    table = Table(table_name, MetaData(), autoload_with=connection)
+    Index(index_name, *[table.c[column] for column in columns], unique=unique).create(connection)
+    return True
+
+
+def drop_index(connection, table_name, index_name):
+    inspector = inspect(connection)
+    if not inspector.has_table(table_name):
+        return False
+    table = Table(table_name, MetaData(), autoload_with=connection)
+    index = next((index for index in table.indexes if index.name == index_name), None)
+    if index is None:
+        return False
+    index.drop(connection)
+    return True
+
+
+def add_column(connection, table_name, column):
+    inspector = inspect(connection)
+    if not inspector.has_table(table_name):
+        return False
+    if any(existing['name'] == column.name for existing in inspector.get_columns(table_name)):
+        return False
+    preparer = connection.dialect.identifier_preparer
+    connection.execute(text(
+        f'ALTER TABLE {preparer.quote(table_name)} ADD COLUMN {preparer.quote(column.name)} '
+        f'{column.type.compile(connection.dialect)}'
+    ))
+    return True
+
+
+def add_attendance_activity_indexes(connection):
+    create_index(connection, 'attendance', 'ix_attendance_employee_date', ['employee_id', 'date', 'clock_out'])
+    create_index(connection, 'attendance', 'ix_attendance_date', ['date', 'clock_out'])
+    create_index(connection, 'activity', 'ix_activity_timestamp', ['timestamp'])
+    create_index(connection, 'activity', 'ix_activity_user_timestamp', ['user_id', 'timestamp'])
+
+
+def add_employee_keyset_indexes(connection):
+    create_index(connection, 'employee', 'ix_employee_name_id', ['name', 'id'])
+    create_index(connection, 'employee', 'ix_employee_department_name_id', ['department', 'name', 'id'])
+
+
+def add_attendance_open_session(connection):
+    if not inspect(connection).has_table('attendance'):
+        return
+    add_column(connection, 'attendance', Column('open_day', Date))
+    add_column(connection, 'attendance', Column('clock_in_key', String(64)))
+    add_column(connection, 'attendance', Column('clock_out_key', String(64)))
+    # Mark the sessions that are still open. If an employee has several
+    # open sessions on one day (the race this index prevents), only the
+    # latest is marked, so the unique index can be built.
+    connection.execute(text(
+        'UPDATE attendance SET open_day = date '
+        'WHERE clock_out IS NULL AND open_day IS NULL AND id IN ('
+        '  SELECT id FROM (SELECT MAX(id) AS id FROM attendance'
+        '                  WHERE clock_out IS NULL GROUP BY employee_id, date) AS latest)'
+    ))
+    create_index(connection, 'attendance', 'ix_attendance_open_session', ['employee_id', 'open_day'], unique=True)
+    create_index(connection, 'attendance', 'ix_attendance_employee_clock_in_key',
+                 ['employee_id', 'clock_in_key'], unique=True)
+
+
+def scope_clock_in_keys_to_employee(connection):
+    # 0003 first made clock-in keys unique across all employees, so one
+    # employee's key could swallow another's clock-in
+    create_index(connection, 'attendance', 'ix_attendance_employee_clock_in_key',
+                 ['employee_id', 'clock_in_key'], unique=True)
+    drop_index(connection, 'attendance', 'ix_attendance_clock_in_key')
+
+
+def add_activity_keyset_indexes(connection):
+    # (timestamp, id) for the timeline, replacing the timestamp-only ones
+    create_index(connection, 'activity', 'ix_activity_timestamp_id', ['timestamp', 'id'])
+    create_index(connection, 'activity', 'ix_activity_type_timestamp_id', ['type', 'timestamp', 'id'])
+    create_index(connection, 'activity', 'ix_activity_user_timestamp_id', ['user_id', 'timestamp', 'id'])
+    create_index(connection, 'activity_archive', 'ix_activity_archive_timestamp_id', ['timestamp', 'id'])
+    drop_index(connection, 'activity', 'ix_activity_timestamp')
+    drop_index(connection, 'activity', 'ix_activity_user_timestamp')
+    drop_index(connection, 'activity_archive', 'ix_activity_archive_timestamp')
+
+
+MIGRATIONS = [
+    ('0001', 'Attendance and Activity hot-path indexes', add_attendance_activity_indexes),
+    ('0002', 'Employee directory keyset pagination indexes', add_employee_keyset_indexes),
+    ('0003', 'One open attendance session per employee and day; punch idempotency keys',
+     add_attendance_open_session),
+    ('0004', 'Activity timeline keyset pagination indexes', add_activity_keyset_indexes),
+    ('0005', 'Punch idempotency keys unique per employee', scope_clock_in_keys_to_employee),
+]
+
+
+def applied_revisions(connection):
+    schema_migrations.create(connection, checkfirst=True)
+    return {row.revision for row in connection.execute(schema_migrations.select())}
+
+
+def upgrade(connection, echo=print):
+    applied = applied_revisions(connection)
+    pending = [migration for migration in MIGRATIONS if migration[0] not in applied]
+    for revision, description, step in pending:
+        echo(f'Applying {revision}: {description}')
+        step(connection)
+        connection.execute(schema_migrations.insert().values(
+            revision=revision, applied_at=datetime.utcnow()
+        ))
+    return [migration[0] for migration in pending]
+
+
+def stamp(connection):
+    # Mark every step as applied, for databases just built by create_all()
+    applied = applied_revisions(connection)
+    for revision, _, _ in MIGRATIONS:
+        if revision not in applied:
+            connection.execute(schema_migrations.insert().values(
+                revision=revision, applied_at=datetime.utcnow()
+            ))
@@ -0,0 +1,567 @@
+from datetime import datetime, date, timedelta
+
+from flask import current_app, g, has_app_context
+from flask_login import UserMixin
+from sqlalchemy import func, event, inspect as sa_inspect, union_all
+from sqlalchemy.exc import IntegrityError
+from werkzeug.security import generate_password_hash, check_password_hash
+
+import search
+from extensions import db, dashboard_cache, activity_writer
+
+class User(UserMixin, db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(80), unique=True, nullable=False)
+    password_hash = db.Column(db.String(255), nullable=False)
+    role = db.Column(db.String(20), nullable=False)  # admin, hr, employee
+    employee = db.relationship('Employee', backref='user', uselist=False, cascade='all, delete-orphan')
+
+    def set_password(self, password):
+        self.password_hash = generate_password_hash(password)
+
+    def check_password(self, password):
+        return check_password_hash(self.password_hash, password)
+
+class Employee(db.Model):
+    __table_args__ = (
+        # keyset pagination of the employee directory, see employee_page()
+        db.Index('ix_employee_name_id', 'name', 'id'),
+        db.Index('ix_employee_department_name_id', 'department', 'name', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    # active_history: the Department counters need the old values on update
+    department = db.column_property(db.Column(db.String(50), nullable=False), active_history=True)
+    position = db.Column(db.String(50), nullable=False)
+    salary = db.column_property(db.Column(db.Float, nullable=False), active_history=True)
+    hire_date = db.Column(db.DateTime, default=datetime.utcnow)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), unique=True)
+    attendance = db.relationship('Attendance', backref='employee', lazy=True, cascade='all, delete-orphan')
+    monthly_summaries = db.relationship('AttendanceMonthlySummary', lazy=True, cascade='all, delete-orphan')
+
+    def _stats(self):
+        # Stats preloaded for this request by load_employee_stats(), if any
+        if not has_app_context():
+            return None
+        return g.get('employee_stats', {}).get(self.id)
+
+    @property
+    def is_present(self):
+        stats = self._stats()
+        if stats is not None:
+            return stats.is_present
+        today = date.today()
+        return Attendance.query.filter(
+            Attendance.employee_id == self.id,
+            Attendance.date == today,
+            Attendance.clock_out.is_(None)
+        ).first() is not None
+
+    @property
+    def present_days(self):
+        stats = self._stats()
+        if stats is not None:
+            return stats.present_days
+        summary = AttendanceMonthlySummary.for_month(self.id, date.today())
+        return summary.days_present if summary else 0
+
+    @property
+    def avg_hours(self):
+        stats = self._stats()
+        if stats is not None:
+            return stats.avg_hours
+        summary = AttendanceMonthlySummary.for_month(self.id, date.today())
+        return summary.avg_hours if summary else 0
+
+    @property
+    def last_attendance(self):
+        stats = self._stats()
+        if stats is not None:
+            return stats.last_attendance
+        return Attendance.query.filter_by(
+            employee_id=self.id
+        ).order_by(Attendance.date.desc()).first()
+
+    @property
+    def recent_attendance(self):
+        stats = self._stats()
+        if stats is not None:
+            return stats.recent_attendance
+        return Attendance.query.filter_by(
+            employee_id=self.id
+        ).order_by(Attendance.date.desc()).limit(5).all()
+
+class Department(db.Model):
+    # Canonical departments with headcount and salary totals, kept up to
+    # date by the Employee mapper events below (Employee.department holds
+    # the canonical name) and rebuilt with `flask repair-departments`
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), unique=True, nullable=False)
+    headcount = db.Column(db.Integer, nullable=False, default=0)
+    salary_sum = db.Column(db.Float, nullable=False, default=0)
+    aliases = db.relationship('DepartmentAlias', backref='department', lazy=True, cascade='all, delete-orphan')
+
+    @property
+    def avg_salary(self):
+        return self.salary_sum / self.headcount if self.headcount else 0
+
+class DepartmentAlias(db.Model):
+    # Other spellings of a department name, lower-cased
+    alias = db.Column(db.String(50), primary_key=True)
+    department_id = db.Column(db.Integer, db.ForeignKey('department.id', ondelete='CASCADE'), nullable=False)
+
+# Seeded by `flask repair-departments`; also used until it has run
+DEFAULT_DEPARTMENT_ALIASES = {'hr': 'Human Resources'}
+
+class Attendance(db.Model):
+    __table_args__ = (
+        # clock_in/clock_out, is_present and the monthly views
+        db.Index('ix_attendance_employee_date', 'employee_id', 'date', 'clock_out'),
+        # today's records across all employees (dashboard, HR view)
+        db.Index('ix_attendance_date', 'date', 'clock_out'),
+        # At most one open session per employee and day. open_day is the
+        # date while the session is open and NULL once it is closed, and
+        # NULLs never collide in a unique index.
+        db.Index('ix_attendance_open_session', 'employee_id', 'open_day', unique=True),
+        # A replayed clock-in (same employee and idempotency key) can't add
+        # a session; keys are only unique per employee
+        db.Index('ix_attendance_employee_clock_in_key', 'employee_id', 'clock_in_key', unique=True),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'), nullable=False)
+    clock_in = db.Column(db.DateTime, nullable=False)
+    clock_out = db.Column(db.DateTime)
+    date = db.Column(db.Date, nullable=False)
+    open_day = db.Column(db.Date)
+    clock_in_key = db.Column(db.String(64))
+    clock_out_key = db.Column(db.String(64))
+
+    @classmethod
+    def close(cls, employee_id, day, clock_out, key=None):
+        # Close the employee's open session for `day`. The UPDATE only
+        # matches a row that is still open, so of two concurrent clock-outs
+        # exactly one wins; a session opened after `clock_out` (by a racing
+        # clock-in) is left alone. Returns the closed row's (id, clock_in),
+        # or None.
+        values = dict(clock_out=clock_out, open_day=None, clock_out_key=key)
+        options = {'synchronize_session': False}
+        if db.engine.dialect.update_returning:
+            return db.session.execute(
+                db.update(cls).where(cls.employee_id == employee_id, cls.open_day == day,
+                                     cls.clock_in <= clock_out)
+                .values(**values).returning(cls.id, cls.clock_in),
+                execution_options=options
+            ).first()
+        # No UPDATE ... RETURNING (MySQL): find the row, then close it only
+        # if it is still open
+        session = db.session.query(cls.id, cls.clock_in).filter(
+            cls.employee_id == employee_id, cls.open_day == day, cls.clock_in <= clock_out
+        ).first()
+        if session is None:
+            return None
+        closed = db.session.execute(
+            db.update(cls).where(cls.id == session.id, cls.open_day.is_not(None)).values(**values),
+            execution_options=options
+        )
+        return session if closed.rowcount else None
+
+class AttendanceArchive(db.Model):
+    # Attendance rows from months before the hot window, moved here by
+    # `flask archive-history`; same columns and ids as Attendance
+    __table_args__ = (
+        db.Index('ix_attendance_archive_employee_date', 'employee_id', 'date'),
+        db.Index('ix_attendance_archive_date', 'date'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    employee_id = db.Column(db.Integer, db.ForeignKey('employee.id', ondelete='CASCADE'), nullable=False)
+    clock_in = db.Column(db.DateTime, nullable=False)
+    clock_out = db.Column(db.DateTime)
+    date = db.Column(db.Date, nullable=False)
+
+class AttendanceMonthlySummary(db.Model):
+    # Rollup of Attendance per employee and month, kept up to date by
+    # clock_in/clock_out and rebuilt with `flask rebuild-attendance-summary`
+    employee_id = db.Column(db.Integer, db.ForeignKey('employee.id', ondelete='CASCADE'), primary_key=True)
+    month = db.Column(db.Date, primary_key=True)  # first day of the month
+    days_present = db.Column(db.Integer, nullable=False, default=0)
+    closed_sessions = db.Column(db.Integer, nullable=False, default=0)
+    total_seconds = db.Column(db.Integer, nullable=False, default=0)
+
+    @property
+    def avg_hours(self):
+        if not self.closed_sessions:
+            return 0
+        return round(self.total_seconds / self.closed_sessions / 3600, 2)
+
+    @classmethod
+    def for_month(cls, employee_id, day):
+        return db.session.get(cls, (employee_id, day.replace(day=1)))
+
+    @classmethod
+    def bump(cls, employee_id, day, days=0, sessions=0, seconds=0):
+        # Increment the counters inside the caller's transaction, normally
+        # with a single UPDATE. The increments run as SQL expressions so
+        # concurrent punches don't overwrite each other; `days` may itself
+        # be a SQL expression.
+        month = day.replace(day=1)
+        seconds = int(round(seconds))
+        update = db.update(cls).where(cls.employee_id == employee_id, cls.month == month).values(
+            days_present=cls.days_present + days,
+            closed_sessions=cls.closed_sessions + sessions,
+            total_seconds=cls.total_seconds + seconds
+        )
+        options = {'synchronize_session': False}
+        if db.session.execute(update, execution_options=options).rowcount:
+            return
+        try:
+            with db.session.begin_nested():
+                db.session.execute(db.insert(cls).values(
+                    employee_id=employee_id, month=month,
+                    days_present=days, closed_sessions=sessions, total_seconds=seconds
+                ))
+        except IntegrityError:
+            # Another request created this month's row first
+            db.session.execute(update, execution_options=options)
+
+class DailySnapshot(db.Model):
+    # Attendance per day and department, written after close of business
+    # by snapshots.py; the trend charts read only this table
+    day = db.Column(db.Date, primary_key=True)
+    department = db.Column(db.String(50), primary_key=True)
+    headcount = db.Column(db.Integer, nullable=False, default=0)
+    present = db.Column(db.Integer, nullable=False, default=0)
+    total_seconds = db.Column(db.Integer, nullable=False, default=0)
+    late_arrivals = db.Column(db.Integer, nullable=False, default=0)
+
+class DataVersion(db.Model):
+    # Change counters behind the ETags and fragment caches of conditional.py:
+    # one row per table ('employees', 'attendance', 'snapshots') and per
+    # employee's attendance (attendance_version_key), bumped by the write
+    # routes inside the transaction that makes the change
+    key = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False)  # UTC
+
+    @classmethod
+    def bump(cls, *keys):
+        # Like AttendanceMonthlySummary.bump: one UPDATE, and an INSERT for
+        # keys seen for the first time. Call it just before committing, the
+        # table-wide rows are shared by every writer.
+        keys = sorted(set(keys))
+        now = datetime.utcnow()
+        update = db.update(cls).where(cls.key.in_(keys)).values(version=cls.version + 1, updated_at=now)
+        options = {'synchronize_session': False}
+        if db.session.execute(update, execution_options=options).rowcount == len(keys):
+            return
+        existing = {key for (key,) in db.session.query(cls.key).filter(cls.key.in_(keys))}
+        for key in keys:
+            if key in existing:
+                continue
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(db.insert(cls).values(key=key, version=1, updated_at=now))
+            except IntegrityError:
+                # Another request created it first
+                db.session.execute(update.where(cls.key == key), execution_options=options)
+
+    @classmethod
+    def current(cls, keys):
+        # {key: (version, updated_at)}; keys never bumped are at version 0
+        found = {key: (version, updated_at) for key, version, updated_at in db.session.query(
+            cls.key, cls.version, cls.updated_at
+        ).filter(cls.key.in_(keys))}
+        return {key: found.get(key, (0, None)) for key in keys}
+
+ACTIVITY_TYPES = ('clock_in', 'clock_out', 'new_employee', 'update_employee', 'delete_employee')
+# Kept as ActivityDailyCount rows once older than ACTIVITY_RETENTION_DAYS
+COMPACTED_ACTIVITY_TYPES = ('clock_in', 'clock_out')
+
+class Activity(db.Model):
+    __table_args__ = (
+        # keyset pagination of the timeline on (timestamp, id), optionally
+        # by type or user, see views/activity.py
+        db.Index('ix_activity_timestamp_id', 'timestamp', 'id'),
+        db.Index('ix_activity_type_timestamp_id', 'type', 'timestamp', 'id'),
+        db.Index('ix_activity_user_timestamp_id', 'user_id', 'timestamp', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    type = db.Column(db.String(50), nullable=False)  # clock_in, clock_out, new_employee, update_employee, delete_employee
+    message = db.Column(db.String(255), nullable=False)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    
+    @classmethod
+    def log(cls, type, message, user_id):
+        # Never commits: the row is written with the caller's commit. In
+        # sync mode it joins the caller's transaction; in async mode it is
+        # handed to activity_writer once that transaction commits, and
+        # dropped if it rolls back.
+        if current_app.config['ACTIVITY_WRITER'] == 'sync':
+            db.session.add(cls(type=type, message=message, user_id=user_id))
+            return
+        db.session.info.setdefault('pending_activities', []).append({
+            'type': type,
+            'message': message,
+            'user_id': user_id,
+            'timestamp': datetime.utcnow(),
+        })
+
+class ActivityArchive(db.Model):
+    __table_args__ = (
+        db.Index('ix_activity_archive_timestamp_id', 'timestamp', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    type = db.Column(db.String(50), nullable=False)
+    message = db.Column(db.String(255), nullable=False)
+    timestamp = db.Column(db.DateTime)
+    user_id = db.Column(db.Integer)
+
+class ActivityDailyCount(db.Model):
+    # Punch activity past the retention window, counted per day and type by
+    # `flask compact-activity` as it deletes the raw rows
+    day = db.Column(db.Date, primary_key=True)
+    type = db.Column(db.String(50), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    @classmethod
+    def add(cls, day, type, count):
+        # Same UPDATE-then-INSERT as AttendanceMonthlySummary.bump
+        update = db.update(cls).where(cls.day == day, cls.type == type).values(count=cls.count + count)
+        options = {'synchronize_session': False}
+        if db.session.execute(update, execution_options=options).rowcount:
+            return
+        try:
+            with db.session.begin_nested():
+                db.session.execute(db.insert(cls).values(day=day, type=type, count=count))
+        except IntegrityError:
+            db.session.execute(update, execution_options=options)
+
+def hot_window_start(today=None):
+    # First day of the oldest month kept in the hot tables
+    start = (today or date.today()).replace(day=1)
+    for _ in range(current_app.config['ARCHIVE_KEEP_MONTHS'] - 1):
+        start = (start - timedelta(days=1)).replace(day=1)
+    return start
+
+def attendance_models(start_date=None):
+    # Tables that can hold attendance on or after start_date (None: all of
+    # history). Rows older than the hot window may not be archived yet, so
+    # those reads check both tables.
+    if start_date is None or start_date < hot_window_start():
+        return [AttendanceArchive, Attendance]
+    return [Attendance]
+
+def attendance_union(*columns, start_date=None, end_date=None):
+    # The named columns from every table covering the range, as one subquery
+    selects = []
+    for model in attendance_models(start_date):
+        select = db.select(*[getattr(model, column) for column in columns])
+        if start_date:
+            select = select.where(model.date >= start_date)
+        if end_date:
+            select = select.where(model.date <= end_date)
+        selects.append(select)
+    return (selects[0] if len(selects) == 1 else union_all(*selects)).subquery()
+
+def write_activities(app, rows):
+    # Runs on the activity writer's thread
+    with app.app_context():
+        db.session.execute(Activity.__table__.insert(), rows)
+        db.session.commit()
+        invalidate_dashboard('activities')
+
+@event.listens_for(db.session.session_factory, 'after_commit')
+def enqueue_pending_activities(session):
+    for row in session.info.pop('pending_activities', []):
+        activity_writer.log(row)
+
+@event.listens_for(db.session.session_factory, 'after_transaction_end')
+def discard_pending_activities(session, transaction):
+    # Rolled back before committing; nothing to write
+    if transaction.parent is None:
+        session.info.pop('pending_activities', None)
+
+class EmployeeSearchTrigram(db.Model):
+    # Trigram index over Employee name, department and position, kept in
+    # sync by the Employee mapper events below
+    __table_args__ = (
+        db.Index('ix_employee_search_trigram_employee', 'employee_id'),
+    )
+
+    trigram = db.Column(db.String(3), primary_key=True)
+    employee_id = db.Column(db.Integer, db.ForeignKey('employee.id', ondelete='CASCADE'), primary_key=True)
+
+def employee_trigram_rows(employee_id, name, department, position):
+    return [
+        {'trigram': trigram, 'employee_id': employee_id}
+        for trigram in search.trigrams(name, department, position)
+    ]
+
+def _reindex_employee(connection, employee):
+    table = EmployeeSearchTrigram.__table__
+    connection.execute(table.delete().where(table.c.employee_id == employee.id))
+    rows = employee_trigram_rows(employee.id, employee.name, employee.department, employee.position)
+    if rows:
+        connection.execute(table.insert(), rows)
+
+@event.listens_for(Employee, 'after_insert')
+def index_new_employee(mapper, connection, employee):
+    _reindex_employee(connection, employee)
+
+@event.listens_for(Employee, 'after_update')
+def reindex_updated_employee(mapper, connection, employee):
+    state = sa_inspect(employee)
+    if any(state.attrs[field].history.has_changes() for field in ('name', 'department', 'position')):
+        _reindex_employee(connection, employee)
+
+@event.listens_for(Employee, 'after_delete')
+def unindex_deleted_employee(mapper, connection, employee):
+    table = EmployeeSearchTrigram.__table__
+    connection.execute(table.delete().where(table.c.employee_id == employee.id))
+
+def adjust_department(connection, name, headcount=0, salary=0):
+    # Add to a department's counters on the caller's connection, creating
+    # the department on its first employee
+    table = Department.__table__
+    update = table.update().where(table.c.name == name).values(
+        headcount=table.c.headcount + headcount,
+        salary_sum=table.c.salary_sum + salary
+    )
+    if connection.execute(update).rowcount:
+        return
+    try:
+        with connection.begin_nested():
+            connection.execute(table.insert().values(name=name, headcount=headcount, salary_sum=salary))
+    except IntegrityError:
+        # Another transaction created it first
+        connection.execute(update)
+
+@event.listens_for(Employee, 'after_insert')
+def count_new_employee(mapper, connection, employee):
+    adjust_department(connection, employee.department, 1, employee.salary)
+
+@event.listens_for(Employee, 'after_update')
+def recount_updated_employee(mapper, connection, employee):
+    state = sa_inspect(employee)
+    department = state.attrs.department.history
+    salary = state.attrs.salary.history
+    if not (department.has_changes() or salary.has_changes()):
+        return
+    old_department = department.deleted[0] if department.deleted else employee.department
+    old_salary = salary.deleted[0] if salary.deleted else employee.salary
+    adjust_department(connection, old_department, -1, -old_salary)
+    adjust_department(connection, employee.department, 1, employee.salary)
+
+@event.listens_for(Employee, 'after_delete')
+def uncount_deleted_employee(mapper, connection, employee):
+    adjust_department(connection, employee.department, -1, -employee.salary)
+
+class EmployeeStats:
+    def __init__(self):
+        self.is_present = False
+        self.present_days = 0
+        self.avg_hours = 0
+        self.recent_attendance = []
+
+    @property
+    def last_attendance(self):
+        return self.recent_attendance[0] if self.recent_attendance else None
+
+def load_employee_stats(employees, recent_limit=5):
+    # Resolve the Employee stats properties for a whole list of employees
+    # with a few grouped queries and keep them on g for the current request
+    employee_ids = [employee.id for employee in employees]
+    stats = {employee_id: EmployeeStats() for employee_id in employee_ids}
+    if not employee_ids:
+        return stats
+
+    today = date.today()
+    start_of_month = today.replace(day=1)
+
+    # Who is currently clocked in
+    present_ids = db.session.query(Attendance.employee_id).filter(
+        Attendance.employee_id.in_(employee_ids),
+        Attendance.date == today,
+        Attendance.clock_out.is_(None)
+    ).distinct().all()
+    for (employee_id,) in present_ids:
+        stats[employee_id].is_present = True
+
+    # Month-to-date days and average hours from the monthly rollup
+    summaries = AttendanceMonthlySummary.query.filter(
+        AttendanceMonthlySummary.employee_id.in_(employee_ids),
+        AttendanceMonthlySummary.month == start_of_month
+    ).all()
+    for summary in summaries:
+        stats[summary.employee_id].present_days = summary.days_present
+        stats[summary.employee_id].avg_hours = summary.avg_hours
+
+    # Latest records per employee in one windowed query
+    ranked = db.session.query(
+        Attendance.id,
+        func.row_number().over(
+            partition_by=Attendance.employee_id,
+            order_by=(Attendance.date.desc(), Attendance.id.desc())
+        ).label('row_rank')
+    ).filter(Attendance.employee_id.in_(employee_ids)).subquery()
+    recent_records = Attendance.query.join(
+        ranked, Attendance.id == ranked.c.id
+    ).filter(
+        ranked.c.row_rank <= recent_limit
+    ).order_by(Attendance.employee_id, Attendance.date.desc(), Attendance.id.desc()).all()
+    for record in recent_records:
+        stats[record.employee_id].recent_attendance.append(record)
+
+    if has_app_context():
+        g.setdefault('employee_stats', {}).update(stats)
+    return stats
+
+def month_range(selected_month):
+    # 'YYYY-MM' -> (first day, first day of the next month)
+    year, month = map(int, selected_month.split('-'))
+    start_date = date(year, month, 1)
+    if month == 12:
+        end_date = date(year + 1, 1, 1)
+    else:
+        end_date = date(year, month + 1, 1)
+    return start_date, end_date
+
+def normalize_department(department):
+    # Canonical name for a department as typed: an alias, an existing
+    # department spelled with different case, or the name itself
+    department = department.strip()
+    key = department.lower()
+    name = db.session.query(Department.name).join(DepartmentAlias).filter(
+        DepartmentAlias.alias == key
+    ).scalar() or db.session.query(Department.name).filter(
+        func.lower(Department.name) == key
+    ).scalar()
+    return name or DEFAULT_DEPARTMENT_ALIASES.get(key, department)
+
+def department_totals():
+    # Departments that have employees, largest first
+    return Department.query.filter(Department.headcount > 0).order_by(
+        Department.headcount.desc(), Department.name
+    ).all()
+
+def department_names():
+    return [name for (name,) in db.session.query(Department.name).filter(
+        Department.headcount > 0
+    ).order_by(Department.name)]
+
+def dashboard_cache_key(part):
+    # Presence is per day, so a new day starts with a fresh key
+    if part == 'presence':
+        return f'dashboard:presence:{date.today().isoformat()}'
+    return f'dashboard:{part}'
+
+def invalidate_dashboard(*parts):
+    dashboard_cache.delete(*[dashboard_cache_key(part) for part in parts])
+
+def attendance_version_key(employee_id):
+    return f'attendance:{employee_id}'
@@ -0,0 +1,74 @@
+import json
+import queue
+import threading
+
+# In-process pub/sub behind the live presence board (/attendance/live).
+#
+# clock_in, clock_out and /api/punches publish one event per punch after
+# they commit. Every open board holds a small queue, and publish() puts the
+# already-formatted Server-Sent Event on each of them, so a punch costs one
+# broadcast however many boards are open. A board that falls too far behind
+# is closed; the browser reconnects and receives a fresh snapshot.
+#
+# Events only reach boards connected to the same process. With several
+# worker processes each board sees the punches its own worker handles, plus
+# a full snapshot whenever it reconnects.
+
+
+def format_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data, default=str)}\n\n'
+
+
+class PresenceBroker:
+    def __init__(self, max_queue=100, heartbeat=15):
+        self.max_queue = max_queue
+        self.heartbeat = heartbeat
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    @property
+    def subscribers(self):
+        return len(self._subscribers)
+
+    def subscribe(self):
+        subscriber = queue.Queue(self.max_queue)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, event, data):
+        message = format_event(event, data)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(message)
+            except queue.Full:
+                # Too slow to keep up: drop its backlog and tell it to close
+                self.unsubscribe(subscriber)
+                with subscriber.mutex:
+                    subscriber.queue.clear()
+                subscriber.put_nowait(None)
+
+    def stream(self, subscriber, snapshot):
+        # Generator for the response body; the subscriber is registered
+        # before the snapshot is read, so no punch falls between the two
+        try:
+            yield 'retry: 3000\n\n'
+            yield format_event('snapshot', snapshot)
+            while True:
+                try:
+                    message = subscriber.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    # Keeps proxies from timing out and notices closed clients
+                    yield ': keep-alive\n\n'
+                    continue
+                if message is None:
+                    return
+                yield message
+        finally:
+            self.unsubscribe(subscriber)
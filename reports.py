@@ -0,0 +1,160 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import traceback
+
+# Monthly attendance reports (a PDF with a PNG chart) rendered by a pool of
+# worker processes. Every job is identified by a hash of its parameters and
+# the data it is built from, and its status and output files live in
+# `cache_dir`, so any web worker can answer a poll or serve a finished file,
+# and asking again for unchanged data returns the cached result.
+#
+# matplotlib and reportlab are only imported inside the worker processes,
+# and the process pool machinery only once the first report is requested.
+
+STALE_AFTER = 600  # seconds before an unfinished job is resubmitted
+
+
+def job_key(params, data):
+    payload = json.dumps({'params': params, 'data': data}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+
+def _write_json(path, value):
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(value, f)
+    os.replace(tmp, path)
+
+
+class ReportJobs:
+    def __init__(self, cache_dir, workers=2):
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def path(self, key, extension):
+        return os.path.join(self.cache_dir, f'{key}.{extension}')
+
+    def status(self, key):
+        try:
+            with open(self.path(key, 'json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def submit(self, params, data):
+        key = job_key(params, data)
+        status = self.status(key)
+        if status and (status['state'] == 'done' or
+                       (status['state'] == 'pending' and time.time() - status['submitted'] < STALE_AFTER)):
+            return key, status
+        os.makedirs(self.cache_dir, exist_ok=True)
+        status = {'state': 'pending', 'submitted': time.time(), 'params': params}
+        _write_json(self.path(key, 'json'), status)
+        self._executor().submit(render_report, self.cache_dir, key, params, data)
+        return key, status
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+                # spawn, so workers don't inherit the web process's threads and locks
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._pool
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+                self._pool = None
+
+
+def render_report(cache_dir, key, params, data):
+    # Runs in a worker process
+    status_path = os.path.join(cache_dir, f'{key}.json')
+    status = {'state': 'pending', 'submitted': time.time(), 'params': params}
+    try:
+        chart_path = os.path.join(cache_dir, f'{key}.png')
+        pdf_path = os.path.join(cache_dir, f'{key}.pdf')
+        labels, values, value_label = _chart_series(params, data)
+        _render_chart(chart_path + '.tmp', params['title'], labels, values, value_label)
+        os.replace(chart_path + '.tmp', chart_path)
+        _render_pdf(pdf_path + '.tmp', params, data, chart_path)
+        os.replace(pdf_path + '.tmp', pdf_path)
+        status.update(state='done', finished=time.time())
+    except Exception:
+        status.update(state='failed', finished=time.time(), error=traceback.format_exc(limit=3))
+    _write_json(status_path, status)
+    return status['state']
+
+
+def _chart_series(params, data):
+    if params['kind'] == 'department':
+        return ([row['name'] for row in data['rows']],
+                [round(row['total_seconds'] / 3600, 1) for row in data['rows']],
+                'Hours worked')
+    return ([row['date'][-2:] for row in data['rows']],
+            [row['hours'] for row in data['rows']],
+            'Hours worked')
+
+
+def _render_chart(path, title, labels, values, value_label):
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib import pyplot as plt
+
+    figure, axes = plt.subplots(figsize=(8, 4), dpi=100)
+    axes.bar(range(len(values)), values, color='#4361ee')
+    axes.set_xticks(range(len(labels)))
+    axes.set_xticklabels(labels, rotation=60 if len(labels) > 10 else 0, ha='right', fontsize=8)
+    axes.set_ylabel(value_label)
+    axes.set_title(title)
+    figure.tight_layout()
+    figure.savefig(path, format='png')
+    plt.close(figure)
+
+
+def _render_pdf(path, params, data, chart_path):
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import cm
+    from reportlab.platypus import Image, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+    styles = getSampleStyleSheet()
+    story = [Paragraph(params['title'], styles['Title']), Spacer(1, 0.3 * cm)]
+    story.append(Image(chart_path, width=17 * cm, height=8.5 * cm))
+    story.append(Spacer(1, 0.5 * cm))
+
+    if params['kind'] == 'department':
+        table = [['Employee', 'Days present', 'Sessions', 'Hours', 'Avg hours']]
+        for row in data['rows']:
+            hours = row['total_seconds'] / 3600
+            table.append([
+                row['name'],
+                row['days_present'],
+                row['closed_sessions'],
+                f'{hours:.1f}',
+                f"{hours / row['closed_sessions']:.2f}" if row['closed_sessions'] else '-',
+            ])
+    else:
+        table = [['Date', 'Clock in', 'Clock out', 'Hours']]
+        for row in data['rows']:
+            table.append([row['date'], row['clock_in'], row['clock_out'] or '-', f"{row['hours']:.2f}"])
+
+    grid = Table(table, repeatRows=1)
+    grid.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#343a40')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+    ]))
+    story.append(grid)
+    SimpleDocTemplate(path, pagesize=A4, title=params['title']).build(story)
@@ -1,13 +1,19 @@
-from app import db, app, User, Employee
+from app import create_app
+from extensions import db
+from models import User, Employee
+import migrations
 from datetime import datetime
 
 def reset_database():
+    app = create_app()
     with app.app_context():
         # Drop all tables
         db.drop_all()
         
         # Create all tables
         db.create_all()
+        with db.engine.begin() as connection:
+            migrations.stamp(connection)
         
         # Create default admin user
         admin = User(username='admin', role='admin')
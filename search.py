@@ -0,0 +1,56 @@
+import unicodedata
+
+# Trigram tokenizer for the employee search index (EmployeeSearchTrigram).
+#
+# Each word is padded with two boundary markers in front and one behind, so
+# "ann" yields $$a, $an, ann, nn$. A query word is padded in front only,
+# which makes "an" a prefix of "ann". Misspellings still share most of their
+# trigrams with the indexed word, which gives fuzzy matching for free.
+
+BOUNDARY = '$'
+
+
+def _is_word_char(char):
+    # Letters, digits and the spacing vowel signs of scripts like Devanagari,
+    # which \w doesn't count as word characters
+    return unicodedata.category(char)[0] in 'LNM'
+
+
+def words(text):
+    # Case-folded words in any script. Accents are dropped (NFKD, then the
+    # nonspacing marks go) so "José" and "jose" match; the base characters
+    # of every script are kept.
+    text = unicodedata.normalize('NFKD', text or '').casefold()
+    text = ''.join(char for char in text if unicodedata.category(char) != 'Mn')
+    text = unicodedata.normalize('NFC', text)
+    result, word = [], []
+    for char in text + ' ':
+        if _is_word_char(char):
+            word.append(char)
+        elif word:
+            result.append(''.join(word))
+            word = []
+    return result
+
+
+def _word_trigrams(word, closed):
+    padded = BOUNDARY * 2 + word + (BOUNDARY if closed else '')
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def trigrams(*fields):
+    # Trigrams stored for an indexed document
+    result = set()
+    for field in fields:
+        for word in words(field):
+            result |= _word_trigrams(word, closed=True)
+    return result
+
+
+def query_trigrams(text):
+    # Trigrams looked up for a search string; the last word may be unfinished
+    query_words = words(text)
+    result = set()
+    for position, word in enumerate(query_words):
+        result |= _word_trigrams(word, closed=position < len(query_words) - 1)
+    return result
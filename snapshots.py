@@ -0,0 +1,149 @@
+import atexit
+import logging
+import threading
+from datetime import date, datetime, time, timedelta
+
+logger = logging.getLogger(__name__)
+
+# Daily attendance snapshots (DailySnapshot: one row per day and
+# department) for the trend charts, so they never re-aggregate raw
+# attendance. A day is written once it has closed, i.e. after SNAPSHOT_AT
+# on that day:
+#
+#   - DailyScheduler runs materialize_due() in-process every day at
+#     SNAPSHOT_AT, catching up on every day missed since the last snapshot
+#   - `flask snapshot-days` does the same from cron, or rewrites a range
+#
+# Writing a range replaces its rows, so running both, or several worker
+# processes each running the scheduler, only repeats work.
+
+
+def parse_time(value):
+    hour, minute = map(int, value.split(':'))
+    return time(hour, minute)
+
+
+class DailyScheduler:
+    # Calls `job` on a daemon thread every day at `at` (local time). The
+    # thread starts on the first start() call, i.e. in the process that
+    # serves requests, not in a preforking master.
+
+    def __init__(self, job, at=time(19, 0)):
+        self.job = job
+        self.at = at
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self.last_run = None
+
+    def next_run(self, now=None):
+        now = now or datetime.now()
+        run = datetime.combine(now.date(), self.at)
+        return run if run > now else run + timedelta(days=1)
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopped.clear()
+                self._thread = threading.Thread(target=self._run, name='snapshot-scheduler', daemon=True)
+                self._thread.start()
+                atexit.register(self.stop)
+
+    def stop(self, timeout=10):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        self._stopped.set()
+        if thread is not None and thread.is_alive():
+            thread.join(timeout)
+        atexit.unregister(self.stop)
+
+    def _run(self):
+        while not self._stopped.wait((self.next_run() - datetime.now()).total_seconds()):
+            try:
+                self.job()
+                self.last_run = datetime.now()
+            except Exception:
+                logger.exception('Daily snapshot job failed')
+
+
+def last_closed_day(at, now=None):
+    now = now or datetime.now()
+    return now.date() if now.time() >= at else now.date() - timedelta(days=1)
+
+
+def materialize(start_date, end_date):
+    # (Re)write the snapshots for start..end, a month at a time; needs an
+    # app context. Returns the number of rows written.
+    from analytics import daily_by_department
+    from extensions import db
+    from models import DailySnapshot, DataVersion, month_range
+    from views.analytics import load_attendance_frame, load_staff, late_after_seconds
+
+    staff = load_staff()
+    written = 0
+    start = start_date
+    while start <= end_date:
+        end = min(end_date, month_range(start.strftime('%Y-%m'))[1] - timedelta(days=1))
+        rows = daily_by_department(load_attendance_frame(start, end), staff, start, end,
+                                   late_after=late_after_seconds())
+        DailySnapshot.query.filter(
+            DailySnapshot.day >= start, DailySnapshot.day <= end
+        ).delete(synchronize_session=False)
+        if rows:
+            db.session.execute(DailySnapshot.__table__.insert(), rows)
+        DataVersion.bump('snapshots')
+        db.session.commit()
+        written += len(rows)
+        start = end + timedelta(days=1)
+    return written
+
+
+def due_range(app, now=None):
+    # Days from the one after the latest snapshot (or the backfill window)
+    # through the last closed day; None if there is nothing to do
+    from extensions import db
+    from models import DailySnapshot
+
+    end_date = last_closed_day(parse_time(app.config['SNAPSHOT_AT']), now)
+    latest = db.session.query(db.func.max(DailySnapshot.day)).scalar()
+    earliest = end_date - timedelta(days=app.config['SNAPSHOT_BACKFILL_DAYS'] - 1)
+    start_date = max(earliest, latest + timedelta(days=1)) if latest else earliest
+    return (start_date, end_date) if start_date <= end_date else None
+
+
+def materialize_due(app):
+    # Runs on the scheduler's thread
+    with app.app_context():
+        due = due_range(app)
+        if due is None:
+            return 0
+        written = materialize(*due)
+        logger.info('Wrote %d daily snapshot rows for %s..%s', written, *due)
+        return written
+
+
+def trend(days, department=None, today=None):
+    # Daily totals over the last `days` snapshots (up to today), summed over
+    # departments or for one department
+    from extensions import db
+    from models import DailySnapshot
+
+    end_date = today or date.today()
+    query = db.session.query(
+        DailySnapshot.day,
+        db.func.sum(DailySnapshot.headcount),
+        db.func.sum(DailySnapshot.present),
+        db.func.sum(DailySnapshot.total_seconds),
+        db.func.sum(DailySnapshot.late_arrivals)
+    ).filter(DailySnapshot.day > end_date - timedelta(days=days), DailySnapshot.day <= end_date)
+    if department:
+        query = query.filter(DailySnapshot.department == department)
+    return [{
+        'date': day.isoformat(),
+        'headcount': int(headcount),
+        'present': int(present),
+        'presence_rate': round(present / headcount, 4) if headcount else 0,
+        'hours': round(total_seconds / 3600, 1),
+        'late_arrivals': int(late_arrivals),
+    } for day, headcount, present, total_seconds, late_arrivals in
+        query.group_by(DailySnapshot.day).order_by(DailySnapshot.day)]
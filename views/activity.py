@@ -0,0 +1,118 @@
+from datetime import datetime
+
+from flask import Blueprint, render_template, request, jsonify, abort
+from flask_login import login_required, current_user
+from sqlalchemy import or_
+
+from db_routing import replica_reads
+from extensions import db
+from models import User, Activity, ActivityArchive, ActivityDailyCount, ACTIVITY_TYPES, COMPACTED_ACTIVITY_TYPES
+from views.employees import encode_cursor, decode_cursor, page_size
+
+bp = Blueprint('activity', __name__)
+
+def parse_activity_cursor(token):
+    # (timestamp, id) of the last row shown, or None; raises ValueError
+    # for a malformed cursor
+    if not token:
+        return None
+    values = decode_cursor(token)
+    try:
+        timestamp, activity_id = values
+        return datetime.fromisoformat(timestamp), int(activity_id)
+    except (TypeError, ValueError):
+        raise ValueError('invalid cursor')
+
+def activity_page(types=(), user_id=None, cursor=None, per_page=50):
+    # One page of the timeline, newest first, ordered by (timestamp, id).
+    # Archived rows are all older than the hot table's, so the archive is
+    # only read once the hot table runs out.
+    rows = []
+    for model in (Activity, ActivityArchive):
+        query = db.session.query(
+            model.id, model.type, model.message, model.timestamp, model.user_id, User.username
+        ).outerjoin(User, User.id == model.user_id).filter(model.timestamp.isnot(None))
+        if types:
+            query = query.filter(model.type.in_(types))
+        if user_id is not None:
+            query = query.filter(model.user_id == user_id)
+        if cursor:
+            # The first condition alone bounds the index range
+            last_timestamp, last_id = cursor
+            query = query.filter(
+                model.timestamp <= last_timestamp,
+                or_(model.timestamp < last_timestamp, model.id < last_id)
+            )
+        rows += query.order_by(model.timestamp.desc(), model.id.desc()).limit(per_page + 1 - len(rows)).all()
+        if len(rows) > per_page:
+            break
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor([rows[-1].timestamp.isoformat(), rows[-1].id])
+    return rows, next_cursor
+
+def activity_filters():
+    # (types, user_id) from the query string; employees only ever see
+    # their own activity. Aborts with 404 for an unknown username.
+    types = [value for value in request.args.getlist('type') if value in ACTIVITY_TYPES]
+    if current_user.role not in ['admin', 'hr']:
+        return types, int(current_user.id)
+    user_id = request.args.get('user_id', type=int)
+    username = request.args.get('user', '').strip()
+    if user_id is None and username:
+        user_id = db.session.query(User.id).filter(User.username == username).scalar()
+        if user_id is None:
+            abort(404)
+    return types, user_id
+
+def daily_counts(limit=30):
+    # The latest compacted days, newest first, as {'day', <type>: count}
+    days = {}
+    rows = ActivityDailyCount.query.order_by(ActivityDailyCount.day.desc(), ActivityDailyCount.type).limit(
+        limit * len(COMPACTED_ACTIVITY_TYPES)
+    )
+    for row in rows:
+        days.setdefault(row.day, {'day': row.day.isoformat()})[row.type] = row.count
+    return list(days.values())[:limit]
+
+@bp.route('/activity')
+@login_required
+@replica_reads
+def activity():
+    try:
+        cursor = parse_activity_cursor(request.args.get('after'))
+    except ValueError:
+        abort(400)
+    types, user_id = activity_filters()
+    activities, next_cursor = activity_page(types, user_id, cursor, page_size(request.args.get('per_page')))
+    return render_template('activity.html',
+                           activities=activities,
+                           next_cursor=next_cursor,
+                           is_first_page=cursor is None,
+                           activity_types=ACTIVITY_TYPES,
+                           selected_types=types,
+                           daily_counts=daily_counts() if current_user.role in ['admin', 'hr'] else [])
+
+@bp.route('/api/activity')
+@login_required
+@replica_reads
+def api_activity():
+    try:
+        cursor = parse_activity_cursor(request.args.get('after'))
+    except ValueError:
+        return jsonify({'error': 'invalid cursor'}), 400
+    types, user_id = activity_filters()
+    activities, next_cursor = activity_page(types, user_id, cursor, page_size(request.args.get('per_page')))
+    return jsonify({
+        'activities': [{
+            'id': activity.id,
+            'type': activity.type,
+            'message': activity.message,
+            'timestamp': activity.timestamp.isoformat(),
+            'user_id': activity.user_id,
+            'username': activity.username,
+        } for activity in activities],
+        'next_cursor': next_cursor,
+    })
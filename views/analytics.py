@@ -0,0 +1,117 @@
+from datetime import date, timedelta
+
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app
+from flask_login import login_required, current_user
+
+from conditional import conditional
+from db_routing import replica_reads
+from extensions import db, analytics_cache
+from models import Employee, AttendanceMonthlySummary, attendance_union, month_range
+
+bp = Blueprint('analytics', __name__)
+
+MAX_ANALYTICS_DAYS = 366
+
+def parse_analytics_range(start, end):
+    # Defaults to the year up to today; raises ValueError for bad ranges
+    end_date = date.fromisoformat(end) if end else date.today()
+    start_date = date.fromisoformat(start) if start else end_date - timedelta(days=MAX_ANALYTICS_DAYS - 1)
+    if start_date > end_date or (end_date - start_date).days >= MAX_ANALYTICS_DAYS:
+        raise ValueError('invalid range')
+    return start_date, end_date
+
+def months_between(start_date, end_date):
+    month = start_date.replace(day=1)
+    while month <= end_date:
+        yield month
+        month = month_range(month.strftime('%Y-%m'))[1]
+
+def month_fingerprints(start_date, end_date):
+    # The monthly summary moves on every punch, so its totals identify the
+    # state of a month's attendance without reading the rows themselves
+    rows = db.session.query(
+        AttendanceMonthlySummary.month,
+        db.func.count(),
+        db.func.sum(AttendanceMonthlySummary.days_present),
+        db.func.sum(AttendanceMonthlySummary.closed_sessions),
+        db.func.sum(AttendanceMonthlySummary.total_seconds)
+    ).filter(
+        AttendanceMonthlySummary.month >= start_date.replace(day=1),
+        AttendanceMonthlySummary.month <= end_date
+    ).group_by(AttendanceMonthlySummary.month).all()
+    return {month: ':'.join(str(int(value or 0)) for value in totals) for month, *totals in rows}
+
+def load_month_frame(month):
+    from analytics import AttendanceFrame
+
+    # Plain column tuples straight into arrays; no ORM objects. Dates come
+    # back as the driver returns them (text on SQLite) instead of being
+    # turned into Python datetimes first
+    start_date, end_date = month_range(month.strftime('%Y-%m'))
+    records = attendance_union('employee_id', 'date', 'clock_in', 'clock_out',
+                               start_date=start_date, end_date=end_date - timedelta(days=1))
+    select = db.select(records.c.employee_id, *[
+        db.type_coerce(records.c[name], db.String) for name in ('date', 'clock_in', 'clock_out')
+    ])
+    rows = db.session.connection(bind_arguments={'clause': select}).execute(select).all()
+    return AttendanceFrame.from_columns(*zip(*rows)) if rows else AttendanceFrame.empty()
+
+def load_attendance_frame(start_date, end_date):
+    # One cached frame per month, reloaded when that month's summary changes
+    from analytics import AttendanceFrame
+
+    fingerprints = month_fingerprints(start_date, end_date)
+    frames = []
+    for month in months_between(start_date, end_date):
+        fingerprint = fingerprints.get(month)
+        if fingerprint is None:
+            continue
+        key = f'analytics:frame:{month.isoformat()}:{fingerprint}'
+        frames.append(analytics_cache.get_or_set(key, lambda: load_month_frame(month)))
+    return AttendanceFrame.concat(frames)
+
+def load_staff():
+    from analytics import Staff
+
+    rows = db.session.query(Employee.id, Employee.department, Employee.hire_date).all()
+    ids, departments, hire_dates = zip(*rows) if rows else ((), (), ())
+    return Staff(ids, departments, hire_dates)
+
+def late_after_seconds():
+    hour, minute = map(int, current_app.config['ANALYTICS_LATE_AFTER'].split(':'))
+    return hour * 3600 + minute * 60
+
+def analytics_summary(start_date, end_date):
+    from analytics import summarize
+
+    return summarize(load_attendance_frame(start_date, end_date), load_staff(), start_date, end_date,
+                     late_after=late_after_seconds(),
+                     overtime_hours=current_app.config['ANALYTICS_OVERTIME_HOURS'])
+
+@bp.route('/analytics')
+@login_required
+@replica_reads
+def analytics():
+    if current_user.role not in ['admin', 'hr']:
+        flash('You do not have permission to view analytics.', 'danger')
+        return redirect(url_for('dashboard.dashboard'))
+
+    try:
+        start_date, end_date = parse_analytics_range(request.args.get('start'), request.args.get('end'))
+    except ValueError:
+        flash(f'Invalid date range (at most {MAX_ANALYTICS_DAYS} days).', 'danger')
+        start_date, end_date = parse_analytics_range(None, None)
+    return render_template('analytics.html', summary=analytics_summary(start_date, end_date))
+
+@bp.route('/api/analytics')
+@login_required
+@replica_reads
+@conditional(lambda: ['employees', 'attendance'])
+def api_analytics():
+    if current_user.role not in ['admin', 'hr']:
+        return jsonify({'error': 'forbidden'}), 403
+    try:
+        start_date, end_date = parse_analytics_range(request.args.get('start'), request.args.get('end'))
+    except ValueError:
+        return jsonify({'error': f'invalid date range (at most {MAX_ANALYTICS_DAYS} days)'}), 400
+    return jsonify(analytics_summary(start_date, end_date))
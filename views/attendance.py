@@ -0,0 +1,447 @@
+import hmac
+import uuid
+from datetime import datetime, date
+
+from flask import (Blueprint, render_template, request, redirect, url_for, flash, jsonify, Response,
+                   stream_with_context, abort, current_app)
+from flask_login import login_required, current_user
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+
+import attendance_export
+from conditional import conditional, current_versions, fragment
+from db_routing import replica_reads, use_replica
+from extensions import db, presence
+from models import (Employee, Attendance, AttendanceMonthlySummary, Activity, DataVersion, attendance_models,
+                    attendance_union, month_range, invalidate_dashboard, attendance_version_key)
+
+bp = Blueprint('attendance', __name__)
+
+def attendance_versions():
+    # The user's own attendance, and everyone's for the admin/HR board
+    keys = []
+    if current_user.employee:
+        keys.append(attendance_version_key(current_user.employee.id))
+    if current_user.role in ['admin', 'hr']:
+        keys.append('attendance')
+    return keys
+
+@bp.route('/attendance')
+@login_required
+@replica_reads
+@conditional(attendance_versions)
+def attendance():
+    # Get current month for default filter
+    today = date.today()
+    selected_month = request.args.get('month', today.strftime('%Y-%m'))
+    start_date, end_date = month_range(selected_month)
+    employee = current_user.employee
+    current = current_versions()
+    
+    def render_panel():
+        # Get current user's attendance status
+        current_status = None
+        if employee:
+            current_status = Attendance.query.filter(
+                Attendance.employee_id == employee.id,
+                Attendance.date == today,
+                Attendance.clock_out.is_(None)
+            ).first()
+        
+        # Get attendance records for both employees and HR
+        attendance_records = []
+        if employee:
+            # Past months may live in the archive
+            for model in attendance_models(start_date):
+                attendance_records += model.query.filter(
+                    model.employee_id == employee.id,
+                    model.date >= start_date,
+                    model.date < end_date
+                ).order_by(model.date.desc()).all()
+            attendance_records.sort(key=lambda record: record.date, reverse=True)
+        
+        # The punch key is cached with the panel: a punch that uses it bumps
+        # the employee's version, so the next panel gets a fresh one
+        return render_template('_attendance_panel.html',
+                               current_status=current_status,
+                               attendance_records=attendance_records,
+                               selected_month=selected_month,
+                               punch_key=uuid.uuid4().hex)
+    
+    employee_panel = fragment('attendance-panel', (
+        employee.id if employee else None, selected_month, today.isoformat(),
+        current.get(attendance_version_key(employee.id)) if employee else None
+    ), render_panel)
+    
+    # Get all employees' attendance for today (for admin/HR); the live
+    # board keeps it current afterwards
+    today_board = ''
+    if current_user.role in ['admin', 'hr']:
+        today_board = fragment('attendance-board', (today.isoformat(), current['attendance']), lambda: render_template(
+            '_attendance_board.html', today_all_records=todays_presence(today)
+        ))
+    
+    return render_template('attendance.html',
+                         employee_panel=employee_panel,
+                         today_board=today_board)
+
+def todays_presence(today):
+    # Today's attendance with each employee loaded in the same query
+    return Attendance.query.options(joinedload(Attendance.employee)).filter(
+        Attendance.date == today
+    ).order_by(Attendance.clock_in, Attendance.id).all()
+
+def presence_record(record, employee):
+    return {
+        'id': record.id,
+        'employee_id': employee.id,
+        'name': employee.name,
+        'department': employee.department,
+        'date': record.date.isoformat(),
+        'clock_in': record.clock_in.isoformat(timespec='seconds'),
+        'clock_out': record.clock_out.isoformat(timespec='seconds') if record.clock_out else None,
+    }
+
+@bp.route('/attendance/live')
+@login_required
+def attendance_live():
+    # Server-Sent Events: one snapshot of today's board, then a 'punch'
+    # event for every clock-in/clock-out handled by this process
+    if current_user.role not in ['admin', 'hr']:
+        abort(403)
+    subscriber = presence.subscribe()
+    today = date.today()
+    snapshot = {
+        'date': today.isoformat(),
+        'records': [presence_record(record, record.employee) for record in todays_presence(today)],
+    }
+    # The stream doesn't touch the database, so it isn't wrapped in
+    # stream_with_context and holds no connection while it is open
+    return Response(presence.stream(subscriber, snapshot), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def attendance_export_rows(start_date, end_date, department=''):
+    # Attendance joined with Employee for a date range, read through a
+    # server-side cursor in batches so memory stays flat for any range
+    records = attendance_union('id', 'employee_id', 'date', 'clock_in', 'clock_out',
+                               start_date=start_date, end_date=end_date)
+    query = db.session.query(
+        records.c.date,
+        Employee.id,
+        Employee.name,
+        Employee.department,
+        records.c.clock_in,
+        records.c.clock_out
+    ).join(Employee, Employee.id == records.c.employee_id)
+    if department:
+        query = query.filter(Employee.department == department)
+    query = query.order_by(records.c.date, records.c.id).yield_per(2000)
+    with use_replica():
+        for row in query:
+            yield attendance_export.export_row(*row)
+
+def parse_export_range(start, end):
+    # Defaults to the current month to date
+    today = date.today()
+    start_date = date.fromisoformat(start) if start else today.replace(day=1)
+    end_date = date.fromisoformat(end) if end else today
+    return start_date, end_date
+
+@bp.route('/attendance/export')
+@login_required
+def export_attendance():
+    if current_user.role not in ['admin', 'hr']:
+        flash('You do not have permission to export attendance.', 'danger')
+        return redirect(url_for('attendance.attendance'))
+    
+    fmt = request.args.get('format', 'csv')
+    try:
+        start_date, end_date = parse_export_range(request.args.get('start'), request.args.get('end'))
+    except ValueError:
+        flash('Invalid export date range.', 'danger')
+        return redirect(url_for('attendance.attendance'))
+    if fmt not in attendance_export.FORMATS or start_date > end_date:
+        flash('Invalid export request.', 'danger')
+        return redirect(url_for('attendance.attendance'))
+    
+    writer, mimetype = attendance_export.FORMATS[fmt]
+    rows = attendance_export_rows(start_date, end_date, request.args.get('department', ''))
+    filename = f'attendance_{start_date.isoformat()}_{end_date.isoformat()}.{fmt}'
+    return Response(
+        stream_with_context(writer(rows)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+def punch_key():
+    # Idempotency key sent with a punch: the attendance page's hidden field,
+    # or an Idempotency-Key header from other clients
+    key = request.form.get('punch_key') or request.headers.get('Idempotency-Key')
+    return key[:64] if key else None
+
+@bp.route('/clock-in', methods=['POST'])
+@login_required
+def clock_in():
+    if current_user.role not in ['employee', 'hr']:
+        flash('Only employees and HR can clock in.', 'danger')
+        return redirect(url_for('attendance.attendance'))
+    
+    employee = current_user.employee
+    if not employee:
+        flash('Employee record not found.', 'danger')
+        return redirect(url_for('attendance.attendance'))
+    
+    # No check-then-insert: the open-session index rejects a second open
+    # session, whichever request gets there first
+    now = datetime.now()
+    today = now.date()
+    key = punch_key()
+    attendance = Attendance(
+        employee_id=employee.id,
+        clock_in=now,
+        date=today,
+        open_day=today,
+        clock_in_key=key
+    )
+    db.session.add(attendance)
+    try:
+        db.session.flush()
+    except IntegrityError:
+        db.session.rollback()
+        if key and db.session.query(Attendance.id).filter(
+                Attendance.employee_id == employee.id, Attendance.clock_in_key == key).first():
+            # A replay of a clock-in that was already recorded
+            flash('Clocked in successfully.', 'success')
+        else:
+            flash('You are already clocked in.', 'warning')
+        return redirect(url_for('attendance.attendance'))
+    
+    # Count the day once, on its first clock-in
+    first_of_day = ~db.exists().where(
+        Attendance.employee_id == employee.id,
+        Attendance.date == today,
+        Attendance.id != attendance.id
+    )
+    AttendanceMonthlySummary.bump(employee.id, today, days=db.case((first_of_day, 1), else_=0))
+    
+    # Log the activity
+    Activity.log(
+        type='clock_in',
+        message=f'{employee.name} clocked in',
+        user_id=current_user.id
+    )
+    
+    punch = presence_record(attendance, employee)
+    DataVersion.bump('attendance', attendance_version_key(employee.id))
+    db.session.commit()
+    invalidate_dashboard('presence', 'activities')
+    presence.publish('punch', punch)
+    flash('Clocked in successfully.', 'success')
+    return redirect(url_for('attendance.attendance'))
+
+@bp.route('/clock-out', methods=['POST'])
+@login_required
+def clock_out():
+    if current_user.role not in ['employee', 'hr']:
+        flash('Only employees and HR can clock out.', 'danger')
+        return redirect(url_for('attendance.attendance'))
+    
+    employee = current_user.employee
+    if not employee:
+        flash('Employee record not found.', 'danger')
+        return redirect(url_for('attendance.attendance'))
+    
+    now = datetime.now()
+    today = now.date()
+    key = punch_key()
+    closed = Attendance.close(employee.id, today, now, key)
+    if closed is None:
+        if key and db.session.query(Attendance.id).filter(
+                Attendance.employee_id == employee.id, Attendance.clock_out_key == key).first():
+            # A replay of a clock-out that was already recorded
+            flash('Clocked out successfully.', 'success')
+        else:
+            flash('No active clock-in record found.', 'warning')
+        return redirect(url_for('attendance.attendance'))
+    
+    AttendanceMonthlySummary.bump(
+        employee.id,
+        today,
+        sessions=1,
+        seconds=(now - closed.clock_in).total_seconds()
+    )
+    
+    # Log the activity
+    Activity.log(
+        type='clock_out',
+        message=f'{employee.name} clocked out',
+        user_id=current_user.id
+    )
+    
+    punch = presence_record(
+        Attendance(id=closed.id, date=today, clock_in=closed.clock_in, clock_out=now), employee
+    )
+    DataVersion.bump('attendance', attendance_version_key(employee.id))
+    db.session.commit()
+    invalidate_dashboard('presence', 'activities')
+    presence.publish('punch', punch)
+    flash('Clocked out successfully.', 'success')
+    return redirect(url_for('attendance.attendance'))
+
+def punch_api_authorized():
+    # Kiosks authenticate with the shared token, people with their session
+    token = current_app.config['PUNCH_API_TOKEN']
+    header = request.headers.get('Authorization', '')
+    if token and hmac.compare_digest(header.encode(), f'Bearer {token}'.encode()):
+        return True
+    return current_user.is_authenticated and current_user.role in ['admin', 'hr']
+
+def parse_punch(index, event):
+    # Returns (punch, error) for one incoming event
+    if not isinstance(event, dict):
+        return None, 'event must be an object'
+    direction = event.get('direction')
+    if direction not in ('in', 'out'):
+        return None, "direction must be 'in' or 'out'"
+    try:
+        employee_id = int(event.get('employee_id'))
+        timestamp = datetime.fromisoformat(str(event.get('timestamp')))
+    except (TypeError, ValueError):
+        return None, 'employee_id and an ISO 8601 timestamp are required'
+    if timestamp.tzinfo is not None:
+        # Attendance stores naive local times, like clock_in/clock_out
+        timestamp = timestamp.astimezone().replace(tzinfo=None)
+    # Whole seconds: DATETIME columns without fractional precision (MySQL)
+    # round the rest off, and replays are matched on the stored value
+    timestamp = timestamp.replace(microsecond=0)
+    return {'index': index, 'employee_id': employee_id, 'timestamp': timestamp,
+            'direction': direction}, None
+
+@bp.route('/api/punches', methods=['POST'])
+def bulk_punch():
+    if not punch_api_authorized():
+        return jsonify({'error': 'unauthorized'}), 401
+    
+    payload = request.get_json(silent=True) or {}
+    events = payload.get('events')
+    if not isinstance(events, list):
+        return jsonify({'error': 'expected {"events": [...]}'}), 400
+    if len(events) > current_app.config['PUNCH_BATCH_LIMIT']:
+        return jsonify({'error': f'at most {current_app.config["PUNCH_BATCH_LIMIT"]} events per batch'}), 413
+    
+    results = [None] * len(events)
+    punches = []
+    for index, event in enumerate(events):
+        punch, error = parse_punch(index, event)
+        if error:
+            results[index] = {'index': index, 'status': 'invalid', 'error': error}
+        else:
+            punches.append(punch)
+    
+    employee_ids = {punch['employee_id'] for punch in punches}
+    dates = {punch['timestamp'].date() for punch in punches}
+    employees = {}
+    records = []
+    if punches:
+        employees = {
+            employee.id: employee
+            for employee in db.session.query(Employee.id, Employee.name, Employee.department, Employee.user_id).filter(
+                Employee.id.in_(employee_ids)
+            )
+        }
+        # Every existing record the batch could touch, in one query
+        records = Attendance.query.filter(
+            Attendance.employee_id.in_(employee_ids),
+            Attendance.date.in_(dates)
+        ).all()
+    
+    days = {}
+    for record in records:
+        days.setdefault((record.employee_id, record.date), []).append(record)
+    
+    summary_deltas = {}
+    touched = []
+    # Apply punches in time order so an in/out pair in one batch works
+    for punch in sorted(punches, key=lambda punch: punch['timestamp']):
+        result = {'index': punch['index'], 'employee_id': punch['employee_id'],
+                  'direction': punch['direction'], 'timestamp': punch['timestamp'].isoformat()}
+        results[punch['index']] = result
+        employee = employees.get(punch['employee_id'])
+        if employee is None:
+            result.update(status='rejected', error='unknown employee')
+            continue
+        
+        timestamp = punch['timestamp']
+        day_records = days.setdefault((employee.id, timestamp.date()), [])
+        open_record = next((record for record in day_records if record.clock_out is None), None)
+        
+        if punch['direction'] == 'in':
+            replayed = next((record for record in day_records if record.clock_in == timestamp), None)
+            if replayed is not None:
+                result.update(status='duplicate', attendance=replayed)
+                continue
+            if open_record is not None:
+                result.update(status='rejected', error='already clocked in')
+                continue
+            record = Attendance(employee_id=employee.id, clock_in=timestamp, date=timestamp.date(),
+                                open_day=timestamp.date())
+            db.session.add(record)
+            delta = summary_deltas.setdefault((employee.id, timestamp.date().replace(day=1)), [0, 0, 0])
+            if not day_records:
+                delta[0] += 1
+            day_records.append(record)
+            Activity.log('clock_in', f'{employee.name} clocked in', employee.user_id)
+        else:
+            replayed = next((record for record in day_records if record.clock_out == timestamp), None)
+            if replayed is not None:
+                result.update(status='duplicate', attendance=replayed)
+                continue
+            if open_record is None or open_record.clock_in > timestamp:
+                result.update(status='rejected', error='no active clock-in record')
+                continue
+            record = open_record
+            record.clock_out = timestamp
+            record.open_day = None
+            delta = summary_deltas.setdefault((employee.id, record.date.replace(day=1)), [0, 0, 0])
+            delta[1] += 1
+            delta[2] += (record.clock_out - record.clock_in).total_seconds()
+            Activity.log('clock_out', f'{employee.name} clocked out', employee.user_id)
+        result.update(status='applied', attendance=record)
+        touched.append(result)
+    
+    try:
+        db.session.flush()
+    except IntegrityError:
+        # A punch from elsewhere opened a session this batch also opens;
+        # nothing was written, and replaying the batch is safe
+        db.session.rollback()
+        return jsonify({'error': 'conflicting concurrent punch, retry the batch'}), 409
+    
+    # One increment per summary row
+    for (employee_id, month_start), (days_delta, sessions, seconds) in summary_deltas.items():
+        AttendanceMonthlySummary.bump(employee_id, month_start, days=days_delta,
+                                      sessions=sessions, seconds=seconds)
+    
+    # Built before the commit expires the records; one event per record,
+    # its final state, even if the batch punched it in and out
+    db.session.flush()
+    punches = {
+        result['attendance'].id: presence_record(result['attendance'], employees[result['employee_id']])
+        for result in touched
+    }
+    if touched:
+        DataVersion.bump('attendance', *{attendance_version_key(result['employee_id']) for result in touched})
+    db.session.commit()
+    if touched:
+        invalidate_dashboard('presence', 'activities')
+        for punch in punches.values():
+            presence.publish('punch', punch)
+    
+    for result in results:
+        record = result.pop('attendance', None)
+        if record is not None:
+            result['attendance_id'] = record.id
+    counts = {}
+    for result in results:
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+    return jsonify({'results': results, 'counts': counts})
@@ -0,0 +1,127 @@
+from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask_login import UserMixin, login_user, login_required, logout_user
+from sqlalchemy.orm import joinedload
+
+from extensions import db, identity_cache, login_manager
+from models import User, Employee, DataVersion, invalidate_dashboard, normalize_department
+
+bp = Blueprint('auth', __name__)
+
+class EmployeeRef:
+    def __init__(self, id, name, department):
+        self.id = id
+        self.name = name
+        self.department = department
+
+class CachedIdentity(UserMixin):
+    # Snapshot of a User and its Employee, built from the plain dict kept in
+    # identity_cache, so logged-in requests don't need to look either of
+    # them up again
+    def __init__(self, snapshot):
+        self.id = snapshot['id']
+        self.username = snapshot['username']
+        self.role = snapshot['role']
+        self.employee = EmployeeRef(*snapshot['employee']) if snapshot['employee'] else None
+
+def identity_snapshot(user):
+    employee = user.employee
+    return {
+        'id': user.id,
+        'username': user.username,
+        'role': user.role,
+        'employee': [employee.id, employee.name, employee.department] if employee else None,
+    }
+
+def identity_cache_key(user_id):
+    return f'identity:{user_id}'
+
+def forget_identity(user_id):
+    identity_cache.delete(identity_cache_key(user_id))
+
+@login_manager.user_loader
+def load_user(user_id):
+    key = identity_cache_key(int(user_id))
+    snapshot = identity_cache.get(key)
+    if snapshot is None:
+        # User and Employee in one query
+        user = db.session.get(User, int(user_id), options=[joinedload(User.employee)])
+        if user is None:
+            return None
+        snapshot = identity_snapshot(user)
+        identity_cache.set(key, snapshot)
+    return CachedIdentity(snapshot)
+
+# Routes
+@bp.route('/')
+def index():
+    return render_template('index.html')
+
+@bp.route('/login', methods=['GET', 'POST'])
+def login():
+    if request.method == 'POST':
+        username = request.form.get('username')
+        password = request.form.get('password')
+        user = User.query.filter_by(username=username).first()
+        
+        if user and user.check_password(password):
+            login_user(user)
+            flash('Logged in successfully.', 'success')
+            return redirect(url_for('dashboard.dashboard'))
+        flash('Invalid username or password', 'danger')
+    return render_template('login.html')
+
+@bp.route('/signup', methods=['GET', 'POST'])
+def signup():
+    if request.method == 'POST':
+        username = request.form.get('username')
+        password = request.form.get('password')
+        name = request.form.get('name')
+        department = (request.form.get('department') or '').strip()
+        position = request.form.get('position')
+        salary = float(request.form.get('salary'))
+
+        if not department:
+            flash('Department is required.', 'danger')
+            return redirect(url_for('auth.signup'))
+        department = normalize_department(department)
+
+        # Check if username already exists
+        if User.query.filter_by(username=username).first():
+            flash('Username already exists. Please choose another.', 'danger')
+            return redirect(url_for('auth.signup'))
+
+        try:
+            # Create user with employee role only
+            user = User(username=username, role='employee')
+            user.set_password(password)
+            db.session.add(user)
+            db.session.flush()  # Get the user ID
+
+            # Create employee record
+            employee = Employee(
+                name=name,
+                department=department,
+                position=position,
+                salary=salary,
+                user_id=user.id
+            )
+            db.session.add(employee)
+            
+            DataVersion.bump('employees')
+            db.session.commit()
+            invalidate_dashboard('employees')
+            flash('Account created successfully! Please login.', 'success')
+            return redirect(url_for('auth.login'))
+        except Exception as e:
+            db.session.rollback()
+            flash('An error occurred while creating your account. Please try again.', 'danger')
+            return redirect(url_for('auth.signup'))
+
+    return render_template('signup.html')
+
+@bp.route('/logout')
+@login_required
+def logout():
+    logout_user()
+    flash('Logged out successfully.', 'success')
+    return redirect(url_for('auth.index'))
@@ -0,0 +1,89 @@
+import hmac
+from datetime import date
+
+from flask import Blueprint, render_template, request, jsonify, Response, current_app
+from flask_login import login_required, current_user
+
+from conditional import conditional
+from db_routing import replica_reads
+from extensions import dashboard_cache, metrics
+from models import Attendance, Activity, dashboard_cache_key, department_totals
+
+bp = Blueprint('dashboard', __name__)
+
+MAX_TREND_DAYS = 730
+
+def load_dashboard_employees():
+    # Headcounts and salary totals are kept per department, so this reads
+    # one small table instead of scanning every employee
+    departments = department_totals()
+    total_employees = sum(department.headcount for department in departments)
+    salary_sum = sum(department.salary_sum for department in departments)
+    
+    return {
+        'total_employees': total_employees,
+        'department_labels': [department.name for department in departments],
+        'department_data': [department.headcount for department in departments],
+        'avg_salary': salary_sum / total_employees if total_employees else 0,
+    }
+
+def load_dashboard_presence():
+    # Get present employees today
+    today = date.today()
+    present_today = Attendance.query.filter(
+        Attendance.date == today,
+        Attendance.clock_out.is_(None)
+    ).count()
+    return {'present_today': present_today}
+
+def load_dashboard_activities():
+    # Get recent activities (last 10), as plain dicts so they can be cached
+    activities = Activity.query.order_by(Activity.timestamp.desc(), Activity.id.desc()).limit(10).all()
+    return {'recent_activities': [
+        {'type': activity.type, 'message': activity.message, 'timestamp': activity.timestamp}
+        for activity in activities
+    ]}
+
+@bp.route('/dashboard')
+@login_required
+@replica_reads
+def dashboard():
+    payload = {}
+    for part, loader in (('employees', load_dashboard_employees),
+                         ('presence', load_dashboard_presence),
+                         ('activities', load_dashboard_activities)):
+        payload.update(dashboard_cache.get_or_set(dashboard_cache_key(part), loader))
+    
+    # Get total departments (after standardization)
+    payload['total_departments'] = len(payload['department_labels'])
+    
+    return render_template('dashboard.html', **payload)
+
+@bp.route('/api/trends')
+@login_required
+@replica_reads
+@conditional(lambda: ['snapshots'])
+def api_trends():
+    # Reads only the daily snapshots, never the attendance rows
+    from snapshots import trend
+
+    days = request.args.get('days', 90, type=int)
+    if not 1 <= days <= MAX_TREND_DAYS:
+        return jsonify({'error': f'days must be between 1 and {MAX_TREND_DAYS}'}), 400
+    department = request.args.get('department') or None
+    return jsonify({'department': department, 'days': trend(days, department)})
+
+@bp.route('/metrics')
+def metrics_endpoint():
+    token = current_app.config['METRICS_TOKEN']
+    header = request.headers.get('Authorization', '')
+    if token and not hmac.compare_digest(header.encode(), f'Bearer {token}'.encode()):
+        return Response('unauthorized\n', status=401, mimetype='text/plain')
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@bp.route('/api/cache-stats')
+@login_required
+def cache_stats():
+    if current_user.role != 'admin':
+        return jsonify({'error': 'forbidden'}), 403
+    return jsonify(dashboard_cache.stats())
@@ -0,0 +1,527 @@
+import base64
+import json
+import math
+from datetime import datetime, date
+
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app
+from flask_login import login_required, current_user
+from sqlalchemy import func, and_, or_
+from sqlalchemy.exc import IntegrityError
+
+import employee_import
+import search
+from conditional import conditional, current_versions, fragment
+from db_routing import replica_reads
+from extensions import db
+from models import (User, Employee, AttendanceArchive, Activity, DataVersion, EmployeeSearchTrigram,
+                    employee_trigram_rows, load_employee_stats, normalize_department, invalidate_dashboard,
+                    adjust_department, department_names)
+from views.auth import forget_identity
+
+bp = Blueprint('employees', __name__)
+
+EMPLOYEES_PER_PAGE = 50
+MAX_EMPLOYEES_PER_PAGE = 200
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+def decode_cursor(token):
+    # Returns None for a missing or malformed cursor
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(values, list) or len(values) != 2:
+        return None
+    return values
+
+def page_size(value):
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return EMPLOYEES_PER_PAGE
+    return max(1, min(size, MAX_EMPLOYEES_PER_PAGE))
+
+SEARCH_MIN_SIMILARITY = 0.6
+
+def search_employee_page(text, department='', cursor=None, per_page=EMPLOYEES_PER_PAGE):
+    # Ranked trigram search; the score is the number of query trigrams an
+    # employee matches and the cursor is the (score, id) of the last row
+    trigrams = search.query_trigrams(text)
+    if not trigrams:
+        return [], None
+    min_score = max(1, math.ceil(len(trigrams) * SEARCH_MIN_SIMILARITY))
+    
+    score = func.count().label('score')
+    query = db.session.query(EmployeeSearchTrigram.employee_id, score).filter(
+        EmployeeSearchTrigram.trigram.in_(trigrams)
+    )
+    if department:
+        query = query.join(Employee, Employee.id == EmployeeSearchTrigram.employee_id).filter(
+            Employee.department == department
+        )
+    query = query.group_by(EmployeeSearchTrigram.employee_id).having(func.count() >= min_score)
+    
+    after = decode_cursor(cursor)
+    if after:
+        last_score, last_id = after
+        query = query.having(or_(
+            func.count() < last_score,
+            and_(func.count() == last_score, EmployeeSearchTrigram.employee_id > last_id)
+        ))
+    
+    ranked = query.order_by(score.desc(), EmployeeSearchTrigram.employee_id).limit(per_page + 1).all()
+    next_cursor = None
+    if len(ranked) > per_page:
+        ranked = ranked[:per_page]
+        next_cursor = encode_cursor([ranked[-1].score, ranked[-1].employee_id])
+    
+    by_id = {
+        employee.id: employee
+        for employee in Employee.query.filter(Employee.id.in_([row.employee_id for row in ranked]))
+    }
+    employees = [by_id[row.employee_id] for row in ranked if row.employee_id in by_id]
+    load_employee_stats(employees)
+    return employees, next_cursor
+
+def employee_page(search='', department='', cursor=None, per_page=EMPLOYEES_PER_PAGE):
+    # One page of the directory ordered by (name, id); the cursor is the
+    # (name, id) of the last row of the previous page
+    if search:
+        return search_employee_page(search, department, cursor, per_page)
+    
+    query = Employee.query
+    
+    if department:
+        query = query.filter(Employee.department == department)
+    
+    after = decode_cursor(cursor)
+    if after:
+        last_name, last_id = after
+        query = query.filter(or_(
+            Employee.name > last_name,
+            and_(Employee.name == last_name, Employee.id > last_id)
+        ))
+    
+    employees = query.order_by(Employee.name, Employee.id).limit(per_page + 1).all()
+    next_cursor = None
+    if len(employees) > per_page:
+        employees = employees[:per_page]
+        next_cursor = encode_cursor([employees[-1].name, employees[-1].id])
+    
+    load_employee_stats(employees)
+    return employees, next_cursor
+
+def directory_versions():
+    # Presence and the month's stats come from attendance
+    return ['employees', 'attendance']
+
+@bp.route('/employees')
+@login_required
+@replica_reads
+@conditional(directory_versions)
+def employees():
+    search = request.args.get('search', '')
+    department = request.args.get('department', '')
+    cursor = request.args.get('after')
+    
+    def render_directory():
+        employees, next_cursor = employee_page(
+            search, department, cursor, page_size(request.args.get('per_page'))
+        )
+        
+        departments = department_names()
+        
+        return render_template('_employee_directory.html',
+                               employees=employees,
+                               departments=departments,
+                               next_cursor=next_cursor,
+                               is_first_page=decode_cursor(cursor) is None)
+    
+    # Shared by everyone with the same role and query
+    directory = fragment('employee-directory', (
+        current_user.role, sorted(request.args.items(multi=True)), date.today().isoformat(),
+        sorted(current_versions().items())
+    ), render_directory)
+    return render_template('employees.html', directory=directory)
+
+@bp.route('/api/employees')
+@login_required
+@replica_reads
+@conditional(directory_versions)
+def api_employees():
+    cursor = request.args.get('after')
+    if cursor and decode_cursor(cursor) is None:
+        return jsonify({'error': 'invalid cursor'}), 400
+    
+    employees, next_cursor = employee_page(
+        request.args.get('search', ''),
+        request.args.get('department', ''),
+        cursor,
+        page_size(request.args.get('per_page'))
+    )
+    return jsonify({
+        'employees': [{
+            'id': employee.id,
+            'name': employee.name,
+            'department': employee.department,
+            'position': employee.position,
+            'salary': employee.salary,
+            'hire_date': employee.hire_date.isoformat() if employee.hire_date else None,
+            'is_present': employee.is_present,
+        } for employee in employees],
+        'next_cursor': next_cursor,
+    })
+
+@bp.route('/add_employee', methods=['GET', 'POST'])
+@login_required
+def add_employee():
+    if current_user.role not in ['admin', 'hr']:
+        flash('You do not have permission to add employees.', 'danger')
+        return redirect(url_for('employees.employees'))
+
+    if request.method == 'POST':
+        # Get form data
+        name = request.form.get('name')
+        department = (request.form.get('department') or '').strip()
+        position = request.form.get('position')
+        salary = float(request.form.get('salary'))
+        username = request.form.get('username')
+        password = request.form.get('password')
+
+        if not department:
+            flash('Department is required.', 'danger')
+            return redirect(url_for('employees.add_employee'))
+        department = normalize_department(department)
+
+        # Check if username already exists
+        if User.query.filter_by(username=username).first():
+            flash('Username already exists. Please choose another.', 'danger')
+            return redirect(url_for('employees.add_employee'))
+
+        try:
+            # Create user account
+            user = User(username=username, role='employee')
+            user.set_password(password)
+            db.session.add(user)
+            db.session.flush()  # Get the user ID
+
+            # Create employee record
+            employee = Employee(
+                name=name,
+                department=department,
+                position=position,
+                salary=salary,
+                user_id=user.id
+            )
+            db.session.add(employee)
+            
+            # Log the activity
+            Activity.log(
+                type='new_employee',
+                message=f'New employee {name} added to {department}',
+                user_id=current_user.id
+            )
+            
+            DataVersion.bump('employees')
+            db.session.commit()
+            invalidate_dashboard('employees', 'activities')
+            flash('Employee added successfully!', 'success')
+            return redirect(url_for('employees.employees'))
+
+        except Exception as e:
+            db.session.rollback()
+            flash('An error occurred while adding the employee. Please try again.', 'danger')
+            return redirect(url_for('employees.add_employee'))
+
+    return render_template('add_employee.html')
+
+@bp.route('/add_hr', methods=['GET', 'POST'])
+@login_required
+def add_hr():
+    # Check if user is admin
+    if current_user.role != 'admin':
+        flash('Only administrators can create HR accounts.', 'danger')
+        return redirect(url_for('employees.employees'))
+
+    if request.method == 'POST':
+        # Get form data
+        name = request.form.get('name')
+        username = request.form.get('username')
+        password = request.form.get('password')
+        salary = float(request.form.get('salary'))
+
+        # Check if username already exists
+        if User.query.filter_by(username=username).first():
+            flash('Username already exists. Please choose another.', 'danger')
+            return redirect(url_for('employees.add_hr'))
+
+        try:
+            # Create HR user account
+            hr_user = User(username=username, role='hr')
+            hr_user.set_password(password)
+            db.session.add(hr_user)
+            db.session.flush()  # Get the user ID
+
+            # Create HR employee record
+            hr_employee = Employee(
+                name=name,
+                department='Human Resources',
+                position='HR Manager',
+                salary=salary,
+                user_id=hr_user.id
+            )
+            db.session.add(hr_employee)
+            DataVersion.bump('employees')
+            db.session.commit()
+            invalidate_dashboard('employees')
+
+            flash('HR account created successfully!', 'success')
+            return redirect(url_for('employees.employees'))
+
+        except Exception as e:
+            db.session.rollback()
+            flash('An error occurred while creating the HR account. Please try again.', 'danger')
+            return redirect(url_for('employees.add_hr'))
+
+    return render_template('add_hr.html')
+
+def drop_taken_usernames(rows, report):
+    # (line, row) pairs whose username is still free; the others are
+    # reported as errors
+    taken = {username for (username,) in db.session.query(User.username).filter(
+        User.username.in_([row['username'] for _, row in rows])
+    )}
+    for line, row in rows:
+        if row['username'] in taken:
+            report.error(line, f"username {row['username']} already exists")
+    return [(line, row) for line, row in rows if row['username'] not in taken]
+
+def insert_import_chunk(rows):
+    # Users, employees, their search trigrams and department totals for one
+    # chunk of validated, hashed rows, in the caller's transaction
+    user_table = User.__table__
+    employee_table = Employee.__table__
+    db.session.execute(user_table.insert(), [
+        {'username': row['username'], 'password_hash': row['password_hash'], 'role': 'employee'}
+        for row in rows
+    ])
+    user_ids = dict(db.session.query(User.username, User.id).filter(
+        User.username.in_([row['username'] for row in rows])
+    ))
+    db.session.execute(employee_table.insert(), [
+        {'name': row['name'], 'department': row['department'], 'position': row['position'],
+         'salary': row['salary'], 'user_id': user_ids[row['username']],
+         'hire_date': datetime.utcnow()}
+        for row in rows
+    ])
+    # Core inserts skip the mapper events, so index the new rows here
+    new_employees = db.session.query(
+        Employee.id, Employee.name, Employee.department, Employee.position
+    ).filter(Employee.user_id.in_(user_ids.values()))
+    trigram_rows = [
+        trigram_row
+        for employee in new_employees
+        for trigram_row in employee_trigram_rows(*employee)
+    ]
+    if trigram_rows:
+        db.session.execute(EmployeeSearchTrigram.__table__.insert(), trigram_rows)
+    # ...and count them in their departments
+    added = {}
+    for row in rows:
+        headcount, salary = added.get(row['department'], (0, 0))
+        added[row['department']] = (headcount + 1, salary + row['salary'])
+    for department, (headcount, salary) in added.items():
+        adjust_department(db.session.connection(), department, headcount, salary)
+    DataVersion.bump('employees')
+
+def import_employees(stream, fmt, user_id, chunk_size=1000, workers=None):
+    # Bulk-create employee accounts from a CSV/JSONL stream, chunk by chunk:
+    # one username lookup, a pooled password-hashing pass and executemany
+    # inserts per chunk, committed separately so a bad row never undoes
+    # the rest of the file
+    report = employee_import.ImportReport()
+    seen_usernames = set()
+    canonical = {}
+    
+    with employee_import.password_hasher(workers) as pool:
+        for chunk in employee_import.chunked(employee_import.read_rows(stream, fmt), chunk_size):
+            rows = []
+            for line, raw in chunk:
+                row, error = employee_import.validate_row(raw)
+                if error:
+                    report.error(line, error)
+                elif row['username'] in seen_usernames:
+                    report.error(line, f"duplicate username {row['username']} in file")
+                else:
+                    seen_usernames.add(row['username'])
+                    if row['department'] not in canonical:
+                        canonical[row['department']] = normalize_department(row['department'])
+                    row['department'] = canonical[row['department']]
+                    rows.append((line, row))
+            
+            rows = drop_taken_usernames(rows, report)
+            if not rows:
+                continue
+            
+            hashes = employee_import.hash_passwords(pool, [row['password'] for _, row in rows])
+            for (_, row), password_hash in zip(rows, hashes):
+                row['password_hash'] = password_hash
+            while rows:
+                try:
+                    insert_import_chunk([row for _, row in rows])
+                    db.session.commit()
+                    report.imported += len(rows)
+                    break
+                except IntegrityError:
+                    # A username was created by someone else since the check:
+                    # report it like any other taken username and retry the rest
+                    db.session.rollback()
+                    remaining = drop_taken_usernames(rows, report)
+                    if len(remaining) == len(rows):
+                        # Not a username clash after all
+                        for line, row in rows:
+                            report.error(line, f"username {row['username']} could not be inserted")
+                        break
+                    rows = remaining
+    
+    if report.imported:
+        Activity.log(
+            type='new_employee',
+            message=f'{report.imported} employees imported',
+            user_id=user_id
+        )
+        db.session.commit()
+        invalidate_dashboard('employees', 'activities')
+    return report.finish()
+
+@bp.route('/import_employees', methods=['GET', 'POST'])
+@login_required
+def import_employees_upload():
+    if current_user.role not in ['admin', 'hr']:
+        flash('You do not have permission to add employees.', 'danger')
+        return redirect(url_for('employees.employees'))
+    
+    report = None
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            flash('Choose a CSV or JSONL file to import.', 'danger')
+            return redirect(url_for('employees.import_employees_upload'))
+        fmt = 'jsonl' if upload.filename.lower().endswith(('.jsonl', '.ndjson')) else 'csv'
+        report = import_employees(upload.stream, fmt, current_user.id,
+                                  workers=current_app.config['IMPORT_WORKERS'])
+        flash(report.summary(), 'success' if not report.failed else 'warning')
+    
+    return render_template('import_employees.html', report=report)
+
+@bp.route('/edit_employee/<int:id>', methods=['GET', 'POST'])
+@login_required
+def edit_employee(id):
+    # Check if user has permission to edit employees
+    if current_user.role not in ['admin', 'hr']:
+        flash('You do not have permission to edit employees.', 'danger')
+        return redirect(url_for('employees.employees'))
+
+    employee = Employee.query.get_or_404(id)
+    user = User.query.get(employee.user_id)
+
+    if request.method == 'POST':
+        department = (request.form.get('department') or '').strip()
+        if not department:
+            flash('Department is required.', 'danger')
+            return redirect(url_for('employees.edit_employee', id=id))
+
+        try:
+            # Update employee details
+            employee.name = request.form.get('name')
+            employee.department = normalize_department(department)
+            employee.position = request.form.get('position')
+            employee.salary = float(request.form.get('salary'))
+
+            # Update username if changed and not already taken
+            new_username = request.form.get('username')
+            if new_username != user.username:
+                if User.query.filter_by(username=new_username).first():
+                    flash('Username already exists. Please choose another.', 'danger')
+                    return redirect(url_for('employees.edit_employee', id=id))
+                user.username = new_username
+
+            # Update password if provided
+            new_password = request.form.get('password')
+            if new_password:
+                user.set_password(new_password)
+
+            # Log the activity
+            Activity.log(
+                type='update_employee',
+                message=f'Employee {employee.name} updated',
+                user_id=current_user.id
+            )
+            
+            DataVersion.bump('employees')
+            db.session.commit()
+            invalidate_dashboard('employees', 'activities')
+            forget_identity(user.id)
+            flash('Employee updated successfully!', 'success')
+            return redirect(url_for('employees.employees'))
+
+        except Exception as e:
+            db.session.rollback()
+            flash('An error occurred while updating the employee. Please try again.', 'danger')
+            return redirect(url_for('employees.edit_employee', id=id))
+
+    return render_template('edit_employee.html', employee=employee, user=user)
+
+@bp.route('/delete_employee/<int:id>', methods=['POST'])
+@login_required
+def delete_employee(id):
+    if current_user.role not in ['admin', 'hr']:
+        flash('You do not have permission to delete employees.', 'danger')
+        return redirect(url_for('employees.employees'))
+
+    try:
+        employee = Employee.query.get_or_404(id)
+        
+        # Prevent deleting your own account
+        if employee.user_id == current_user.id:
+            flash('You cannot delete your own account.', 'danger')
+            return redirect(url_for('employees.employees'))
+
+        # Store employee name for activity log
+        employee_name = employee.name
+        user_id = employee.user_id
+        
+        # Get the associated user
+        user = User.query.get(user_id)
+        
+        # Archived attendance isn't part of the ORM cascade
+        AttendanceArchive.query.filter_by(employee_id=id).delete(synchronize_session=False)
+        
+        # Delete the user first (this will cascade delete the employee and attendance records)
+        if user:
+            db.session.delete(user)
+        
+        # Log the activity
+        Activity.log(
+            type='delete_employee',
+            message=f'Employee {employee_name} deleted',
+            user_id=current_user.id
+        )
+        
+        DataVersion.bump('employees', 'attendance')
+        db.session.commit()
+        invalidate_dashboard('employees', 'presence', 'activities')
+        forget_identity(user_id)
+        flash('Employee deleted successfully!', 'success')
+        
+    except Exception as e:
+        current_app.logger.exception('Error deleting employee %s', id)
+        db.session.rollback()
+        flash('An error occurred while deleting the employee. Please try again.', 'danger')
+    
+    return redirect(url_for('employees.employees'))
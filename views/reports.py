@@ -0,0 +1,143 @@
+from datetime import date
+
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, send_file, abort
+from flask_login import login_required, current_user
+
+from db_routing import replica_reads
+from extensions import db, report_jobs
+from models import Employee, AttendanceMonthlySummary, attendance_models, month_range, department_names
+
+bp = Blueprint('reports', __name__)
+
+def report_data(kind, selected_month, target):
+    # The figures a monthly report is drawn from; they also key its cache
+    start_date, end_date = month_range(selected_month)
+    if kind == 'department':
+        rows = db.session.query(
+            Employee.name,
+            AttendanceMonthlySummary.days_present,
+            AttendanceMonthlySummary.closed_sessions,
+            AttendanceMonthlySummary.total_seconds
+        ).join(AttendanceMonthlySummary, AttendanceMonthlySummary.employee_id == Employee.id).filter(
+            Employee.department == target,
+            AttendanceMonthlySummary.month == start_date
+        ).order_by(Employee.name, Employee.id).all()
+        return {'rows': [
+            {'name': name, 'days_present': days_present,
+             'closed_sessions': closed_sessions, 'total_seconds': total_seconds}
+            for name, days_present, closed_sessions, total_seconds in rows
+        ]}
+    records = []
+    for model in attendance_models(start_date):
+        records += db.session.query(model.date, model.clock_in, model.clock_out).filter(
+            model.employee_id == target,
+            model.date >= start_date,
+            model.date < end_date
+        ).all()
+    records.sort()
+    return {'rows': [
+        {'date': day.isoformat(),
+         'clock_in': clock_in.strftime('%H:%M'),
+         'clock_out': clock_out.strftime('%H:%M') if clock_out else None,
+         'hours': round((clock_out - clock_in).total_seconds() / 3600, 2) if clock_out else 0}
+        for day, clock_in, clock_out in records
+    ]}
+
+def submit_report(kind, selected_month, target):
+    # Returns (job key, status) or raises ValueError for a bad request
+    if kind not in ('department', 'employee'):
+        raise ValueError('kind must be department or employee')
+    month_range(selected_month)
+    if kind == 'employee':
+        target = int(target)
+        employee = db.session.get(Employee, target)
+        if employee is None:
+            raise ValueError('unknown employee')
+        if current_user.role not in ['admin', 'hr'] and (
+                current_user.employee is None or current_user.employee.id != target):
+            raise PermissionError
+        title = f'{employee.name} - attendance {selected_month}'
+    else:
+        if current_user.role not in ['admin', 'hr']:
+            raise PermissionError
+        if not target:
+            raise ValueError('department is required')
+        title = f'{target} - attendance {selected_month}'
+    params = {'kind': kind, 'month': selected_month, 'target': target, 'title': title}
+    return report_jobs.submit(params, report_data(kind, selected_month, target))
+
+def report_status_or_404(key):
+    status = report_jobs.status(key)
+    if status is None:
+        abort(404)
+    params = status['params']
+    if current_user.role not in ['admin', 'hr'] and not (
+            params['kind'] == 'employee' and current_user.employee is not None
+            and params['target'] == current_user.employee.id):
+        abort(404)
+    return status
+
+def report_status_json(key, status):
+    result = {'job_id': key, 'state': status['state'], 'status_url': url_for('reports.api_report_status', key=key)}
+    if status['state'] == 'done':
+        result['pdf_url'] = url_for('reports.report_file', key=key, extension='pdf')
+        result['chart_url'] = url_for('reports.report_file', key=key, extension='png')
+    elif status['state'] == 'failed':
+        result['error'] = 'report generation failed'
+    return result
+
+@bp.route('/reports', methods=['GET', 'POST'])
+@login_required
+@replica_reads
+def reports():
+    if request.method == 'POST':
+        kind = request.form.get('kind')
+        target = request.form.get('department') if kind == 'department' else request.form.get('employee_id')
+        try:
+            key, _ = submit_report(kind, request.form.get('month', ''), target)
+        except PermissionError:
+            flash('You do not have permission to generate this report.', 'danger')
+            return redirect(url_for('reports.reports'))
+        except ValueError:
+            flash('Invalid report request.', 'danger')
+            return redirect(url_for('reports.reports'))
+        return redirect(url_for('reports.report_status', key=key))
+    
+    departments = department_names()
+    return render_template('reports.html',
+                         departments=departments,
+                         selected_month=date.today().strftime('%Y-%m'))
+
+@bp.route('/reports/<string(length=32):key>')
+@login_required
+def report_status(key):
+    status = report_status_or_404(key)
+    return render_template('report_status.html', key=key, status=status)
+
+@bp.route('/reports/<string(length=32):key>.<any(pdf, png):extension>')
+@login_required
+def report_file(key, extension):
+    status = report_status_or_404(key)
+    if status['state'] != 'done':
+        abort(404)
+    return send_file(report_jobs.path(key, extension),
+                     download_name=f"{status['params']['title']}.{extension}",
+                     as_attachment=extension == 'pdf')
+
+@bp.route('/api/reports', methods=['POST'])
+@login_required
+@replica_reads
+def api_submit_report():
+    payload = request.get_json(silent=True) or {}
+    try:
+        key, status = submit_report(payload.get('kind'), str(payload.get('month', '')), payload.get('target'))
+    except PermissionError:
+        return jsonify({'error': 'forbidden'}), 403
+    except (TypeError, ValueError):
+        return jsonify({'error': 'invalid report request'}), 400
+    return jsonify(report_status_json(key, status)), 202 if status['state'] == 'pending' else 200
+
+@bp.route('/api/reports/<string(length=32):key>')
+@login_required
+def api_report_status(key):
+    return jsonify(report_status_json(key, report_status_or_404(key)))